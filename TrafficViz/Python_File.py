@@ -1,254 +1,2575 @@
-import tkinter as tk
+import argparse
+import contextlib
+import cProfile
 import csv
+import functools
+import glob
+import hashlib
+import html
+import json
+import mmap
+import os
+import pstats
+import queue
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from operator import itemgetter
+
+try:
+    import numpy as np  # Optional: enables the columnar statistics engine
+except ImportError:
+    np = None
+
+try:
+    import tkinter as tk  # Optional: only the interactive histogram window needs it
+except ImportError:
+    tk = None
+
+try:
+    from PIL import Image, ImageDraw, ImageFont  # Optional: enables PNG chart rendering
+except ImportError:
+    Image = None
+
+# Columns every traffic data CSV must provide, and how each one is read (see RowDecoder)
+TRAFFIC_SCHEMA = {
+    "JunctionName": "text",
+    "timeOfDay": "time",
+    "travel_Direction_in": "text",
+    "travel_Direction_out": "text",
+    "Weather_Conditions": "label",
+    "JunctionSpeedLimit": "int",
+    "VehicleSpeed": "int",
+    "VehicleType": "label",
+    "elctricHybrid": "label",
+}
+REQUIRED_COLUMNS = set(TRAFFIC_SCHEMA)
+ELM_AVENUE = "Elm Avenue/Rabbit Road"
+HANLEY_HIGHWAY = "Hanley Highway/Westway"
+TWO_WHEELED_TYPES = ["bicycle", "motorbike", "scooter", "motorcycle"]
+
+# Instrumentation: per-stage timings and row counts, recorded only when enabled
+class Instrumentation:
+    """
+    Collects one record per timed stage: its name, seconds, any row counts and rows/s.
+
+    Stages are timed around whole calls (one file, one write, one draw), never per row, so
+    the pipeline's hot loops are unchanged. When instrumentation is not enabled each
+    instrumented call costs one extra check.
+    """
+    def __init__(self):
+        self.records = []
+        self.local = threading.local()  # The innermost open record, per thread
+
+    @contextlib.contextmanager
+    def stage(self, name, **fields):
+        record = {"stage": name, **fields}
+        parent = getattr(self.local, "record", None)
+        self.local.record = record
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if record.get("rows") and record["seconds"]:
+                record["rows_per_second"] = record["rows"] / record["seconds"]
+            self.local.record = parent
+            self.records.append(record)
+
+    def count(self, **counts):
+        record = getattr(self.local, "record", None)
+        if record is not None:
+            record.update(counts)
+
+    def summary(self):
+        stages = {}
+        for record in self.records:
+            total = stages.setdefault(record["stage"], {"calls": 0, "seconds": 0.0, "rows": 0})
+            total["calls"] += 1
+            total["seconds"] += record["seconds"]
+            total["rows"] += record.get("rows", 0)
+        return stages
+
+    def report(self):
+        print("\nStage timings:")
+        for name, total in self.summary().items():
+            throughput = f" | {total['rows'] / total['seconds']:,.0f} rows/s" if total["rows"] and total["seconds"] else ""
+            print(f"  {name:16} {total['calls']:>5} calls | {total['seconds']:.4f}s{throughput}")
+
+    def export(self, file_name):
+        """Writes every record as one JSON object per line."""
+        with open(file_name, "w") as file:
+            file.writelines(json.dumps(record) + "\n" for record in self.records)
+        print(f"Instrumentation log saved to {file_name}")
+
+
+INSTRUMENTATION = None  # The active Instrumentation, if enabled
+
+
+def enable_instrumentation():
+    global INSTRUMENTATION
+    INSTRUMENTATION = Instrumentation()
+    return INSTRUMENTATION
+
+
+# Decorator that times every call to the function as one stage
+def instrumented(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if INSTRUMENTATION is None:
+                return function(*args, **kwargs)
+            with INSTRUMENTATION.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Function to time a block as a stage when instrumentation is enabled
+def stage(name, **fields):
+    if INSTRUMENTATION is None:
+        return contextlib.nullcontext({})
+    return INSTRUMENTATION.stage(name, **fields)
+
+
+# Function to attach row counts to the stage being timed
+def record_rows(**counts):
+    if INSTRUMENTATION is not None:
+        INSTRUMENTATION.count(**counts)
+
+
+# Function to attach the rows read and skipped by an aggregating engine to the stage being timed
+def record_aggregate_rows(vehicles, diagnostics):
+    missing = diagnostics.counts.get("missing values", 0)
+    record_rows(rows=vehicles + missing, skipped_missing=missing,
+                skipped_bad_speed=diagnostics.counts.get("invalid speed", 0))
+
+
+# Sampling profiler: where the main thread spends its time, line by line
+class SamplingProfiler(threading.Thread):
+    """
+    Records the line the main thread is running every interval seconds.
+
+    Unlike cProfile it does not slow the profiled code down, and it attributes time to lines,
+    which separates e.g. row validation from the metric branches within one loop.
+    """
+    def __init__(self, interval=0.001):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.target_id = threading.main_thread().ident
+        self.samples = {}
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_id)
+            if frame is not None:
+                key = (frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name)
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+    def report(self, limit=20):
+        total = sum(self.samples.values())
+        print(f"\n{total} samples, busiest lines:")
+        for (file_name, line, function), count in sorted(self.samples.items(), key=lambda item: -item[1])[:limit]:
+            print(f"  {count / total:6.1%}  {os.path.basename(file_name)}:{line} ({function})")
+
+    def export(self, file_name):
+        with open(file_name, "w") as file:
+            json.dump([{"file": file_name_, "line": line, "function": function, "samples": count}
+                       for (file_name_, line, function), count in self.samples.items()], file)
+
+
+# Function to run a function under cProfile or the sampling profiler
+def run_profiled(mode, function, output=None):
+    """
+    Runs function() with the chosen profiler and prints the results.
+
+    Args:
+        mode (str): "cprofile" for exact call counts and times per function, or "sample" for
+            low-overhead per-line samples.
+        output (str): A file to save the raw profile to (pstats for cprofile, JSON for
+            sample), or None to only print it.
+    """
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(function)
+        finally:
+            if output:
+                profiler.dump_stats(output)
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    else:
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            function()
+        finally:
+            profiler.stop()
+            if output:
+                profiler.export(output)
+            profiler.report()
+
 
 # Task A: Leap year check function
 def is_leap_year(year):
     return (year % 4 == 0 and year % 100 != 0) or (year % 400 == 0)
 
-# Validate input function for date (day, month, year)
-def validate_in(prompt, value_type, min_value=None, max_value=None):
-    while True:
+# Validate input function for date (day, month, year)
+def validate_in(prompt, value_type, min_value=None, max_value=None):
+    while True:
+        try:
+            user_input = input(prompt)
+            value = value_type(user_input)  # Convert input to correct type
+            if min_value is not None and value < min_value:
+                print(f"Out of range - value must be in the range {min_value} to {max_value}.")
+                continue
+            if max_value is not None and value > max_value:
+                print(f"Out of range - value must be in the range {min_value} to {max_value}.")
+                continue
+            return value  # Valid input
+        except ValueError:
+            print(f"Integer required.")
+
+# Function to get a valid date input from the user
+def get_valid_date():
+    day = validate_in("Please enter the day of the survey in the format dd: ", int, 1, 31)
+    month = validate_in("Please enter the month of the survey in the format MM: ", int, 1, 12)
+    year = validate_in("Please enter the year of the survey in the format YYYY: ", int, 2000, 2024)
+
+    # Month-specific validations
+    if month == 2:
+        if is_leap_year(year):
+            if day > 29:
+                print("February can only have 29 days in a leap year.")
+                return get_valid_date()  # Ask again
+        else:
+            if day > 28:
+                print("February can only have 28 days in a non-leap year.")
+                return get_valid_date()  # Ask again
+    elif month in [4, 6, 9, 11] and day > 30:  # April, June, September, November
+        print(f"Month {month} can only have 30 days.")
+        return get_valid_date()  # Ask again
+
+    return f"{day:02}/{month:02}/{year}"
+
+
+# Function to write a file under a temporary name and move it into place once it is complete
+@contextlib.contextmanager
+def atomic_write(file_name, mode="w", **open_args):
+    """
+    Yields an open temporary file that replaces file_name when the block ends.
+
+    os.replace is a single atomic rename, so readers see either the old file or the whole
+    new one, never a half-written one. If the block fails the temporary file is removed
+    and file_name is left as it was.
+    """
+    temp_name = f"{file_name}.{os.getpid()}.tmp"
+    try:
+        with open(temp_name, mode, **open_args) as file:
+            yield file
+        os.replace(temp_name, file_name)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_name)
+        raise
+
+# Shared ingestion: each CSV is parsed once and the table is reused by every stage
+class TrafficTable:
+    """
+    Holds the rows of one traffic data CSV so it never has to be re-read.
+
+    Args:
+        file_path (str): The CSV file the rows were read from.
+        fieldnames (list): The column names from the header row.
+        rows (list): Each data row as a list of strings in header order.
+    """
+    def __init__(self, file_path, fieldnames, rows):
+        self.file_path = file_path
+        self.fieldnames = fieldnames
+        self.rows = rows
+        self.positions = {name: i for i, name in enumerate(fieldnames)}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def column(self, name):
+        position = self.positions[name]
+        return [row[position] for row in self.rows]
+
+    def iter_rows(self):
+        return iter(self.rows)
+
+    def dict_rows(self):
+        fieldnames = self.fieldnames
+        for row in self.rows:
+            yield dict(zip(fieldnames, row))
+
+
+# Function to parse a traffic data CSV into a TrafficTable
+@instrumented("parse")
+def load_traffic_table(file_path):
+    if file_path.endswith(COLUMNAR_SUFFIX):
+        return TrafficColumns(file_path)  # Binary files are mapped, not parsed
+    with stage("open", file=file_path):
+        file = open(file_path, mode="r")
+    with file:
+        csv_reader = csv.reader(file)
+        fieldnames = next(csv_reader, [])
+        width = len(fieldnames)
+        rows = []
+        for row in csv_reader:
+            if not row:
+                continue  # Blank lines are skipped, as csv.DictReader does
+            if len(row) < width:
+                row += [""] * (width - len(row))  # Short rows read as missing values
+            rows.append(row)
+    record_rows(rows=len(rows))
+    return TrafficTable(file_path, fieldnames, rows)
+
+
+# Function to turn the raw tallies of any engine into the outcomes dictionary
+def build_outcomes(file_path, counts, hanley_traffic_by_hour, rain_hour_count, sketch=None, hours=24):
+    """
+    Builds the outcomes dictionary from raw counts.
+
+    Args:
+        file_path (str): The data file the counts were taken from.
+        counts (dict): Vehicle counters keyed by the local names used in process_csv_data,
+            plus "bicycles" for the total number of bicycles.
+        hanley_traffic_by_hour (dict): Hanley Highway vehicles per hour, in first-seen order.
+        rain_hour_count (int): The number of distinct hours with rain.
+        sketch (TrafficSketch): The mergeable tallies of the survey, stored under "Sketch".
+        hours (int): The hours the counts cover, for the hourly average. Default is one day.
+    """
+    outcomes = {}
+    total_vehicles = counts["total_vehicles"]
+    elm_avenue_vehicles = counts["elm_avenue_vehicles"]
+
+    outcomes["File Name"] = file_path
+    outcomes["Total Vehicles"] = total_vehicles
+    outcomes["Total Trucks"] = counts["total_trucks"]
+    outcomes["Total Electric Vehicles"] = counts["total_electric"]
+    outcomes["Two-Wheeled Vehicles"] = counts["two_wheeled"]
+    outcomes["Buses North"] = counts["buses_north"]
+    outcomes["Vehicles No Turns"] = counts["no_turns"]
+    outcomes["Trucks Percentage"] = round((counts["total_trucks"] / total_vehicles) * 100) if total_vehicles else 0
+    outcomes["Average Bicycles Per Hour"] = round(counts["bicycles"] / hours) if counts["bicycles"] else 0
+    outcomes["Over Speed Limit"] = counts["over_speed_limit"]
+    outcomes["Elm Avenue Vehicles"] = elm_avenue_vehicles
+    outcomes["Hanley Highway Vehicles"] = counts["hanley_highway_vehicles"]
+    outcomes["Scooters Percentage Elm"] = round((counts["scooters_elm_avenue"] / elm_avenue_vehicles) * 100) if elm_avenue_vehicles else 0
+    outcomes["Peak Traffic Count"] = max(hanley_traffic_by_hour.values(), default=0)
+    outcomes["Peak Traffic Hours"] = [
+        f"Between {int(hour):02}:00 and {int(hour)+1}:00"
+        for hour, count in hanley_traffic_by_hour.items()
+        if count == outcomes["Peak Traffic Count"]
+    ]
+    outcomes["Rain Hours"] = rain_hour_count
+    outcomes["HanleyTrafficByHour"] = hanley_traffic_by_hour
+    if sketch is not None:
+        outcomes["Sketch"] = sketch.to_dict()
+    return outcomes
+
+
+# Compiled row decoding: each distinct raw value is checked and converted only once
+MISSING = object()  # Decoded value of a blank field
+INVALID = object()  # Decoded value of a field that is not of its schema type
+DECODE_CACHE_SIZE = 1 << 16  # Distinct values remembered per column
+QUARANTINE_MAX_ROWS = 10_000  # Rejected rows kept for the quarantine file
+
+
+# Function to decode a "text" field: the value itself, interned
+def decode_text(value):
+    return sys.intern(value) if value.strip() else MISSING
+
+
+# Function to decode a "label" field: the stripped, lower-case value, interned
+def decode_label(value):
+    value = value.strip().lower()
+    return sys.intern(value) if value else MISSING
+
+
+# Function to decode an "int" field
+def decode_int(value):
+    if not value.strip():
+        return MISSING
+    number, ok = parse_speed(value)
+    return number if ok else INVALID
+
+
+# Function to decode a "time" field into seconds of the day
+def decode_time(value):
+    if not value.strip():
+        return MISSING
+    seconds = seconds_of_day(value)
+    return INVALID if seconds is None else seconds
+
+
+FIELD_DECODERS = {"text": decode_text, "label": decode_label, "int": decode_int, "time": decode_time}
+
+
+# Dictionary of decoded values, filled as new raw values are met
+class DecodedValues(dict):
+    def __init__(self, decode):
+        super().__init__()
+        self.decode = decode
+
+    def __missing__(self, value):
+        decoded = self.decode(value)
+        if len(self) < DECODE_CACHE_SIZE:  # Bounded, whatever the file holds
+            self[value] = decoded
+        return decoded
+
+
+# Function to check a header row for the columns of a schema (any collection of column names)
+def require_columns(fieldnames, schema=TRAFFIC_SCHEMA):
+    missing = set(schema).difference(fieldnames)
+    if missing:
+        raise KeyError(f"Missing expected columns: {', '.join(sorted(missing))}")
+
+
+class RowDecoder:
+    """
+    Turns raw CSV rows into typed tuples, following a schema compiled for one header row.
+
+    decode(row) returns the values of the schema's columns in schema order, or None for a
+    row too short to hold them. Each field is a cached lookup, so the strip, lower, int
+    and time parsing run once per distinct value rather than once per row. A blank field
+    decodes to MISSING and a field that fails its type to INVALID.
+
+    Args:
+        fieldnames (list): The column names from the header row.
+        schema (dict): Column name to field kind ("text", "label", "int" or "time").
+    """
+    def __init__(self, fieldnames, schema=TRAFFIC_SCHEMA):
+        require_columns(fieldnames, schema)
+        positions = {name: i for i, name in enumerate(fieldnames)}
+        self.names = list(schema)
+        self.width = max(positions[name] for name in schema) + 1
+        # One generated function reads every field by position through its column's cache
+        lookups = {f"values{i}": DecodedValues(FIELD_DECODERS[kind]) for i, kind in enumerate(schema.values())}
+        fields = ", ".join(f"values{i}[row[{positions[name]}]]" for i, name in enumerate(self.names))
+        source = (f"def decode(row, width={self.width}, {', '.join(f'{n}={n}' for n in lookups)}):\n"
+                  f"    if len(row) < width:\n"
+                  f"        return None\n"
+                  f"    return ({fields},)\n")
+        namespace = dict(lookups)
+        exec(compile(source, "<RowDecoder>", "exec"), namespace)
+        self.decode = namespace["decode"]
+
+    def column_of(self, values, marker):
+        """Returns the name of the first column decoded as marker (MISSING or INVALID)."""
+        if values is None:
+            return ""
+        for name, value in zip(self.names, values):
+            if value is marker:
+                return name
+        return ""
+
+
+# Rejected rows with their reason codes, kept up to a limit and written to one CSV file
+class Quarantine:
+    def __init__(self, file_name, max_rows=QUARANTINE_MAX_ROWS):
+        self.file_name = file_name
+        self.max_rows = max_rows
+        self.rows = []
+        self.dropped = 0
+
+    def add(self, reason, row, column=""):
+        if len(self.rows) < self.max_rows:
+            self.rows.append([reason, column] + list(row))
+        else:
+            self.dropped += 1
+
+    def save(self, fieldnames):
+        with atomic_write(self.file_name, newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["reason", "column"] + list(fieldnames))
+            writer.writerows(self.rows)
+        more = f" ({self.dropped} more not kept)" if self.dropped else ""
+        print(f"Quarantined {len(self.rows)} rows in {self.file_name}{more}.")
+
+
+# Task B: Process the CSV data and calculate traffic statistics
+ENGINES = ["python", "numpy", "stream", "index"]  # The engines process_csv_data can run
+
+
+@instrumented("process")
+def process_csv_data(file_path, table=None, engine="python", quarantine=None, histogram=None):
+    """
+    Calculates the traffic statistics for one data file.
+
+    Args:
+        file_path (str): The CSV file to analyse.
+        table (TrafficTable): The file's rows if they have already been parsed.
+        engine (str): "python" for the row-by-row engine, "numpy" for the columnar engine,
+            which gives the same outcomes faster on large files, "stream" to read the
+            file in chunks with constant memory (table is not used), or "index" to build a
+            TrafficIndex and answer each statistic as a query on it.
+        quarantine (str): A CSV file to save the skipped rows to, with their reason codes
+            (python and stream engines).
+        histogram (TrafficHistogram): Counted in the same pass over the file (stream engine
+            only, which has no table to count it from afterwards).
+
+    file_path may also be a binary columnar file written by convert_to_columnar.
+    """
+    outcomes = {}
+
+    try:
+        if engine == "stream":
+            return process_csv_stream(file_path, quarantine=quarantine, histogram=histogram)
+
+        if table is None:
+            table = load_traffic_table(file_path)
+
+        require_columns(table.fieldnames)
+
+        if engine == "index":
+            return TrafficIndex(table).outcomes(file_path)
+
+        if engine == "numpy":
+            if np is not None:
+                return process_columns_numpy(file_path, table)
+            print("NumPy is not installed - using the Python engine instead.")
+
+        # Initialize counters
+        total_vehicles = 0
+        total_trucks = 0
+        total_electric = 0
+        two_wheeled = 0
+        buses_north = 0
+        no_turns = 0
+        over_speed_limit = 0
+        elm_avenue_vehicles = 0
+        hanley_highway_vehicles = 0
+        scooters_elm_avenue = 0
+        bicycles_per_hour = {}
+        hanley_traffic_by_hour = {}
+        rain_hours = set()
+        speed_counts = {}
+        quarantined = Quarantine(quarantine) if quarantine else None
+        diagnostics = RowDiagnostics(quarantine=quarantined)
+        decoder = RowDecoder(table.fieldnames)
+        decode = decoder.decode
+
+        for row in table.iter_rows():
+            values = decode(row)
+            if values is None or MISSING in values:
+                diagnostics.record("missing values", row, decoder.column_of(values, MISSING))
+                continue
+            # Typed values in TRAFFIC_SCHEMA order
+            junction, seconds, direction_in, direction_out, weather, limit, speed, vehicle_type, electric = values
+
+            total_vehicles += 1
+
+            # Count trucks
+            if vehicle_type == "truck":
+                total_trucks += 1
+
+            # Count electric vehicles
+            if electric == "true":
+                total_electric += 1
+
+            # Count two-wheeled vehicles
+            if vehicle_type in TWO_WHEELED_TYPES:
+                two_wheeled += 1
+
+            # Count buses heading North from Elm Avenue
+            if junction == ELM_AVENUE and vehicle_type == "buss" and direction_out.upper() == "N":
+                buses_north += 1
+
+            # Count vehicles not turning
+            if direction_in == direction_out:
+                no_turns += 1
+
+            # Count vehicles over speed limit
+            if speed is INVALID or limit is INVALID:
+                diagnostics.record("invalid speed", row, decoder.column_of(values, INVALID))
+                continue
+            if speed > limit:
+                over_speed_limit += 1
+            speed_counts[speed] = speed_counts.get(speed, 0) + 1
+
+            if seconds is INVALID:
+                diagnostics.record("invalid time", row, "timeOfDay")
+                continue
+            hour = seconds // 3600
+
+            # Count vehicles by junction
+            if junction == ELM_AVENUE:
+                elm_avenue_vehicles += 1
+                if vehicle_type == "scooter":
+                    scooters_elm_avenue += 1
+            elif junction == HANLEY_HIGHWAY:
+                hanley_highway_vehicles += 1
+                hanley_traffic_by_hour[hour] = hanley_traffic_by_hour.get(hour, 0) + 1
+
+            # Count bicycles per hour
+            if vehicle_type == "bicycle":
+                bicycles_per_hour[hour] = bicycles_per_hour.get(hour, 0) + 1
+
+            # Count rain hours
+            if weather == "rain":
+                rain_hours.add(hour)
+
+        diagnostics.report()
+        if quarantined:
+            quarantined.save(table.fieldnames)
+        hanley_traffic_by_hour = {f"{hour:02}": count for hour, count in hanley_traffic_by_hour.items()}
+
+        # Store outcomes
+        counts = {
+            "total_vehicles": total_vehicles,
+            "total_trucks": total_trucks,
+            "total_electric": total_electric,
+            "two_wheeled": two_wheeled,
+            "buses_north": buses_north,
+            "no_turns": no_turns,
+            "over_speed_limit": over_speed_limit,
+            "elm_avenue_vehicles": elm_avenue_vehicles,
+            "hanley_highway_vehicles": hanley_highway_vehicles,
+            "scooters_elm_avenue": scooters_elm_avenue,
+            "bicycles": sum(bicycles_per_hour.values()),
+        }
+        sketch = TrafficSketch.from_tallies(
+            survey_key(file_path), counts, hour_slots(hanley_traffic_by_hour), hour_slots(bicycles_per_hour),
+            hour_slots(dict.fromkeys(rain_hours, 1)), bin_speeds(speed_counts))
+        record_rows(rows=len(table), skipped_missing=diagnostics.counts.get("missing values", 0),
+                    skipped_bad_speed=diagnostics.counts.get("invalid speed", 0))
+        return build_outcomes(file_path, counts, hanley_traffic_by_hour, len(rain_hours), sketch)
+
+    except FileNotFoundError:
+        print(f"Error: File not found - '{file_path}'")
+    except KeyError as e:
+        print(f"Error: {e}")
+    return outcomes
+
+
+# Dictionary of category codes, assigned in first-seen order
+class CategoryCodes(dict):
+    def __missing__(self, value):
+        code = self[value] = len(self)
+        return code
+
+
+# Function to dictionary-encode one column of a table into integer codes
+def encode_column(table, name, lookup=None):
+    """
+    Replaces each value in the column with its code in lookup.
+
+    Passing the same lookup for two columns gives codes that can be compared directly.
+    Returns the codes as a NumPy array and the distinct values in code order.
+    """
+    if isinstance(table, TrafficColumns):
+        return table.encode(name)  # Stored encoded, with both directions sharing one dictionary
+    if lookup is None:
+        lookup = CategoryCodes()
+    values = map(itemgetter(table.positions[name]), table.rows)
+    # Plain dict lookups in C; Python code only runs for a value not seen before
+    codes = np.fromiter(map(lookup.__getitem__, values), dtype=np.int32, count=len(table))
+    return codes, list(lookup)
+
+
+# Function to read timeOfDay as seconds-of-day (-1 if invalid) and which times are blank
+def time_column(table):
+    """
+    Parses HH:MM:SS times with array arithmetic on their characters.
+
+    Times in any other form go through seconds_of_day once per distinct value, so the
+    results are the same as the row decoder's.
+    """
+    if isinstance(table, TrafficColumns) and table.descriptors["timeOfDay"]["kind"] == "time":
+        seconds = np.frombuffer(table.views["timeOfDay"], dtype="i").astype(np.int64)
+        return np.where(seconds < DAY_SECONDS, seconds, -1), np.zeros(len(table), dtype=bool)
+    values = table.column("timeOfDay")
+    lengths = np.fromiter(map(len, values), dtype=np.int32, count=len(values))
+    chars = np.array(values, dtype="U8").view(np.uint32).reshape(len(values), 8).astype(np.int64)
+    digits = chars[:, [0, 1, 3, 4, 6, 7]] - ord("0")
+    hours, minutes, seconds = (digits[:, i] * 10 + digits[:, i + 1] for i in (0, 2, 4))
+    exact = ((lengths == 8) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+             & (chars[:, 2] == ord(":")) & (chars[:, 5] == ord(":"))
+             & (hours < 24) & (minutes < 60) & (seconds < 60))
+    result = np.where(exact, hours * 3600 + minutes * 60 + seconds, -1)
+    blank = np.zeros(len(values), dtype=bool)
+
+    others = np.flatnonzero(~exact)
+    if len(others):
+        lookup = CategoryCodes()
+        codes = np.fromiter(map(lookup.__getitem__, map(values.__getitem__, others.tolist())),
+                            dtype=np.int32, count=len(others))
+        parsed = [seconds_of_day(value) for value in lookup]
+        result[others] = np.array([-1 if value is None else value for value in parsed], dtype=np.int64)[codes]
+        blank[others] = np.array([not value.strip() for value in lookup], dtype=bool)[codes]
+    return result, blank
+
+
+# Function to parse an integer speed without raising
+def parse_speed(value):
+    try:
+        return int(value), True
+    except ValueError:
+        return 0, False
+
+
+# Columnar engine: same outcomes as the row loop, computed with NumPy masks
+def process_columns_numpy(file_path, table):
+    """
+    Calculates the outcomes of process_csv_data from typed column arrays.
+
+    The categorical and speed columns are dictionary-encoded, so each string test (strip,
+    lower, int) runs once per distinct value. Times are parsed straight into a seconds
+    array, as nearly every row has a time of its own. The per-row work is array indexing,
+    boolean masks and bincount.
+    """
+    # Categorical codes for the columns with few distinct values
+    vehicle_codes, vehicle_types = encode_column(table, "VehicleType")
+    electric_codes, electric_flags = encode_column(table, "elctricHybrid")
+    junction_codes, junctions = encode_column(table, "JunctionName")
+    weather_codes, weathers = encode_column(table, "Weather_Conditions")
+    directions = CategoryCodes()  # Shared so that equal directions get equal codes
+    in_codes, _ = encode_column(table, "travel_Direction_in", directions)
+    out_codes, direction_names = encode_column(table, "travel_Direction_out", directions)
+    speed_codes, speeds = encode_column(table, "VehicleSpeed")
+    limit_codes, limits = encode_column(table, "JunctionSpeedLimit")
+    time_seconds, time_blank = time_column(table)
+
+    # Rows with a blank required value are skipped, as in the row loop
+    present = np.ones(len(table), dtype=bool)
+    for codes, categories in ((vehicle_codes, vehicle_types), (electric_codes, electric_flags),
+                              (junction_codes, junctions), (weather_codes, weathers),
+                              (in_codes, direction_names),
+                              (out_codes, direction_names), (speed_codes, speeds),
+                              (limit_codes, limits)):
+        present &= np.array([bool(value.strip()) for value in categories], dtype=bool)[codes]
+    present &= ~time_blank
+    skipped_missing = int(len(table) - present.sum())
+    if skipped_missing:
+        print(f"Skipped {skipped_missing} rows with missing values.")
+
+    # Per-category lookup tables, applied to every row through its code
+    vehicle_names = [value.strip().lower() for value in vehicle_types]
+    vehicle = {name: np.array([value == name for value in vehicle_names], dtype=bool)[vehicle_codes]
+               for name in ("truck", "buss", "bicycle", "scooter")}
+    two_wheeled = np.array([value in TWO_WHEELED_TYPES for value in vehicle_names], dtype=bool)[vehicle_codes]
+    electric = np.array([value.strip().lower() == "true" for value in electric_flags], dtype=bool)[electric_codes]
+    elm = np.array([value == ELM_AVENUE for value in junctions], dtype=bool)[junction_codes]
+    hanley = np.array([value == HANLEY_HIGHWAY for value in junctions], dtype=bool)[junction_codes]
+    north = np.array([value.upper() == "N" for value in direction_names], dtype=bool)[out_codes]
+    rain = np.array([value.strip().lower() == "rain" for value in weathers], dtype=bool)[weather_codes]
+
+    speed_values, speed_ok = zip(*[parse_speed(value) for value in speeds]) if speeds else ((), ())
+    limit_values, limit_ok = zip(*[parse_speed(value) for value in limits]) if limits else ((), ())
+    speed_valid = (np.array(speed_ok, dtype=bool)[speed_codes]
+                   & np.array(limit_ok, dtype=bool)[limit_codes])
+    over_speed = (np.array(speed_values, dtype=np.int64)[speed_codes]
+                  > np.array(limit_values, dtype=np.int64)[limit_codes]) & speed_valid
+
+    invalid_speed = int((present & ~speed_valid).sum())
+    if invalid_speed:
+        print(f"Skipped {invalid_speed} rows with invalid speed data.")
+    record_rows(rows=len(table), skipped_missing=skipped_missing, skipped_bad_speed=invalid_speed)
+
+    time_valid = time_seconds >= 0
+    row_hours = np.maximum(time_seconds, 0) // 3600
+    invalid_time = int((present & speed_valid & ~time_valid).sum())
+    if invalid_time:
+        print(f"Skipped {invalid_time} rows with an invalid time.")
+
+    # Rows with bad speed data or time still count towards the totals before those checks
+    counted = present & speed_valid & time_valid
+    hanley_rows = counted & hanley
+    hanley_hours = row_hours[hanley_rows]
+    hanley_counts = np.bincount(hanley_hours, minlength=24)
+    seen_hours, first_seen = np.unique(hanley_hours, return_index=True)
+    hanley_traffic_by_hour = {
+        f"{hour:02}": int(hanley_counts[hour])
+        for hour in seen_hours[np.argsort(first_seen)]
+    }
+    rain_hour_count = len(np.unique(row_hours[counted & rain]))
+    bicycle_counts = np.bincount(row_hours[counted & vehicle["bicycle"]], minlength=24)
+    rain_counts = np.bincount(row_hours[counted & rain], minlength=24)
+    speed_code_counts = np.bincount(speed_codes[present & speed_valid], minlength=len(speeds))
+    counts_by_speed = {}
+    for speed, count in zip(speed_values, speed_code_counts.tolist()):
+        counts_by_speed[speed] = counts_by_speed.get(speed, 0) + count  # " 5" and "5" share a speed
+
+    counts = {
+        "total_vehicles": int(present.sum()),
+        "total_trucks": int((present & vehicle["truck"]).sum()),
+        "total_electric": int((present & electric).sum()),
+        "two_wheeled": int((present & two_wheeled).sum()),
+        "buses_north": int((present & elm & north & vehicle["buss"]).sum()),
+        "no_turns": int((present & (in_codes == out_codes)).sum()),
+        "over_speed_limit": int((present & over_speed).sum()),
+        "elm_avenue_vehicles": int((counted & elm).sum()),
+        "hanley_highway_vehicles": int(hanley_rows.sum()),
+        "scooters_elm_avenue": int((counted & elm & vehicle["scooter"]).sum()),
+        "bicycles": int((counted & vehicle["bicycle"]).sum()),
+    }
+    sketch = TrafficSketch.from_tallies(
+        survey_key(file_path), counts, hanley_counts.tolist(), bicycle_counts.tolist(),
+        rain_counts.tolist(), bin_speeds(counts_by_speed))
+    return build_outcomes(file_path, counts, hanley_traffic_by_hour, rain_hour_count, sketch)
+
+# Compact binary columnar format: fixed-width, dictionary-encoded columns read through mmap
+COLUMNAR_SUFFIX = ".tvc"
+COLUMNAR_MAGIC = b"TVC1"
+INT_COLUMNS = {"VehicleSpeed", "JunctionSpeedLimit"}
+TIME_COLUMNS = {"timeOfDay"}
+SHARED_DICTIONARIES = {"travel_Direction_in": "directions", "travel_Direction_out": "directions"}
+TIME_PATTERN = re.compile(r"(\d{2}):([0-5]\d):([0-5]\d)")
+
+
+# Function to round a byte offset up to the next multiple of 8
+def align(offset):
+    return (offset + 7) & ~7
+
+
+# Function to format seconds-of-day as the HH:MM:SS text of timeOfDay
+def format_seconds(seconds):
+    return f"{seconds // 3600:02}:{seconds // 60 % 60:02}:{seconds % 60:02}"
+
+
+# Function to parse HH:MM:SS into seconds-of-day, or None if it would not format back the same
+def parse_seconds(value):
+    match = TIME_PATTERN.fullmatch(value)
+    if match is None:
+        return None
+    hours, minutes, seconds = map(int, match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+# Function to parse an int32, or None if it would not format back the same
+def parse_exact_int(value):
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return number if str(number) == value and -2**31 <= number < 2**31 else None
+
+
+# Function to convert a traffic data CSV into the binary columnar format
+def convert_to_columnar(csv_path, out_path=None):
+    """
+    Writes csv_path as a .tvc file and returns the path written.
+
+    Every column is dictionary-encoded into 1, 2 or 4 byte codes; both travel directions
+    share one dictionary so their codes compare directly. Speeds are stored as int32 and
+    timeOfDay as int32 seconds-of-day, unless some value would not read back as the same
+    text, in which case the column stays dictionary-encoded. Reading the file back gives
+    exactly the rows of the CSV, so every engine computes the same outcomes from either.
+
+    Layout: magic, a little-endian uint32 header length, a JSON header, then each column's
+    values, every part aligned to 8 bytes.
+    """
+    if out_path is None:
+        out_path = os.path.splitext(csv_path)[0] + COLUMNAR_SUFFIX
+
+    with open(csv_path, mode="r") as file:
+        csv_reader = csv.reader(file)
+        fieldnames = next(csv_reader, [])
+        width = len(fieldnames)
+        dictionary_names = [SHARED_DICTIONARIES.get(name, name) for name in fieldnames]
+        lookups = {name: CategoryCodes() for name in dictionary_names}
+        column_lookups = [lookups[name] for name in dictionary_names]
+        codes = [array("I") for _ in fieldnames]
+        row_count = 0
+        for row in csv_reader:
+            if not row:
+                continue  # Blank lines are skipped, as in load_traffic_table
+            if len(row) < width:
+                row += [""] * (width - len(row))
+            for value, lookup, column in zip(row, column_lookups, codes):
+                column.append(lookup[value])
+            row_count += 1
+
+    columns = []
+    blobs = []
+    dictionaries = {}
+    offset = 0
+    for name, dictionary_name, column in zip(fieldnames, dictionary_names, codes):
+        values = list(lookups[dictionary_name])
+        parse = parse_seconds if name in TIME_COLUMNS else parse_exact_int if name in INT_COLUMNS else None
+        typed = [parse(value) for value in values] if parse else [None]
+        if None not in typed:
+            kind = "time" if name in TIME_COLUMNS else "int"
+            data = array("i", map(typed.__getitem__, column))
+            columns.append({"name": name, "kind": kind, "typecode": "i", "offset": offset})
+        else:
+            typecode = "B" if len(values) <= 1 << 8 else "H" if len(values) <= 1 << 16 else "I"
+            data = array(typecode, column)
+            dictionaries[dictionary_name] = values
+            columns.append({"name": name, "kind": "category", "typecode": typecode,
+                            "dictionary": dictionary_name, "offset": offset})
+        blobs.append(data)
+        offset = align(offset + len(data) * data.itemsize)
+
+    header = json.dumps({"rows": row_count, "byteorder": sys.byteorder,
+                         "columns": columns, "dictionaries": dictionaries}).encode()
+    with atomic_write(out_path, "wb") as file:
+        file.write(COLUMNAR_MAGIC + struct.pack("<I", len(header)) + header)
+        file.write(b"\0" * (align(file.tell()) - file.tell()))
+        for data in blobs:
+            file.write(data.tobytes())
+            file.write(b"\0" * (align(file.tell()) - file.tell()))
+    return out_path
+
+
+# Read-only view of a binary columnar file, used in place of a TrafficTable
+class TrafficColumns:
+    """
+    Maps a .tvc file into memory and exposes its columns without copying them.
+
+    Offers the same column, dict_rows and fieldnames interface as TrafficTable. Column
+    values are decoded to text only when asked for; encode hands the stored codes to the
+    NumPy engine directly.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, mode="rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC:
+            raise ValueError(f"Not a traffic columnar file: '{file_path}'")
+        (header_size,) = struct.unpack_from("<I", self.buffer, len(COLUMNAR_MAGIC))
+        header_start = len(COLUMNAR_MAGIC) + 4
+        header = json.loads(self.buffer[header_start:header_start + header_size])
+        data_start = align(header_start + header_size)
+
+        self.row_count = header["rows"]
+        self.dictionaries = header["dictionaries"]
+        self.descriptors = {column["name"]: column for column in header["columns"]}
+        self.fieldnames = list(self.descriptors)
+        self.positions = {name: i for i, name in enumerate(self.fieldnames)}
+        self.views = {}
+        buffer = memoryview(self.buffer)
+        for column in header["columns"]:
+            start = data_start + column["offset"]
+            size = array(column["typecode"]).itemsize * self.row_count
+            view = buffer[start:start + size].cast(column["typecode"])
+            if header["byteorder"] != sys.byteorder:
+                view = array(column["typecode"], view)  # Written on another platform
+                view.byteswap()
+            self.views[column["name"]] = view
+
+    def __len__(self):
+        return self.row_count
+
+    def iter_column(self, name):
+        column = self.descriptors[name]
+        view = self.views[name]
+        if column["kind"] == "category":
+            return map(self.dictionaries[column["dictionary"]].__getitem__, view)
+        if column["kind"] == "int":
+            return map(str, view)
+        return map(format_seconds, view)
+
+    def column(self, name):
+        return list(self.iter_column(name))
+
+    def iter_rows(self):
+        return zip(*(self.iter_column(name) for name in self.fieldnames))
+
+    def dict_rows(self):
+        fieldnames = self.fieldnames
+        for row in self.iter_rows():
+            yield dict(zip(fieldnames, row))
+
+    def encode(self, name):
+        """Returns the column as NumPy codes and the distinct values in code order."""
+        column = self.descriptors[name]
+        values = np.frombuffer(self.views[name], dtype=column["typecode"])
+        if column["kind"] == "category":
+            return values, self.dictionaries[column["dictionary"]]
+        distinct, codes = np.unique(values, return_inverse=True)
+        decode = str if column["kind"] == "int" else format_seconds
+        return codes.astype(np.int32), [decode(value) for value in distinct.tolist()]
+
+
+# Names of the raw counters kept by TrafficAggregate
+COUNT_NAMES = ["total_vehicles", "total_trucks", "total_electric", "two_wheeled", "buses_north",
+               "no_turns", "over_speed_limit", "elm_avenue_vehicles", "hanley_highway_vehicles",
+               "scooters_elm_avenue"]
+STREAM_CHUNK_SIZE = 1 << 20  # Bytes read per chunk in streaming mode
+
+
+# Counts and samples the rows skipped while streaming, instead of printing each one
+class RowDiagnostics:
+    def __init__(self, sample_size=5, quarantine=None):
+        self.sample_size = sample_size
+        self.counts = {}
+        self.samples = {}
+        self.quarantine = quarantine  # A Quarantine that also receives every skipped row
+
+    def record(self, reason, row, column=""):
+        self.counts[reason] = self.counts.get(reason, 0) + 1
+        samples = self.samples.setdefault(reason, [])
+        if len(samples) < self.sample_size:
+            samples.append(row)
+        if self.quarantine is not None:
+            self.quarantine.add(reason, row, column)
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def report(self):
+        if not self.counts:
+            return
+        summary = ", ".join(f"{reason}: {count}" for reason, count in self.counts.items())
+        print(f"Skipped {self.total()} rows ({summary})")
+        for reason, samples in self.samples.items():
+            for row in samples:
+                print(f"  e.g. {reason}: {row}")
+
+    def merge(self, other):
+        for reason, count in other.counts.items():
+            self.counts[reason] = self.counts.get(reason, 0) + count
+            samples = self.samples.setdefault(reason, [])
+            samples.extend(other.samples[reason][:self.sample_size - len(samples)])
+
+    def to_dict(self):
+        return {"sample_size": self.sample_size, "counts": self.counts, "samples": self.samples}
+
+    @classmethod
+    def from_dict(cls, state):
+        diagnostics = cls(state["sample_size"])
+        diagnostics.counts = state["counts"]
+        diagnostics.samples = state["samples"]
+        return diagnostics
+
+
+# Running totals for one survey, kept in fixed-size per-hour arrays
+class TrafficAggregate:
+    """
+    Aggregate state of process_csv_data that does not grow with the number of rows.
+
+    Hourly tallies are lists of 24 slots indexed by hour; hanley_hour_order remembers the
+    order in which Hanley Highway hours first appeared so peak hours are listed as the
+    row-by-row engine lists them.
+    """
+    def __init__(self):
+        self.counts = dict.fromkeys(COUNT_NAMES, 0)
+        self.hanley_by_hour = [0] * 24
+        self.hanley_hour_order = []
+        self.bicycles_by_hour = [0] * 24
+        self.rain_by_hour = [False] * 24
+        self.junction_vehicles = {}  # Vehicles per junction name, for every junction seen
+        self.speed_counts = [0] * SPEED_BINS
+
+    def add_rows(self, rows, positions, diagnostics, histogram=None):
+        """
+        Folds parsed CSV rows (lists of strings) into the totals.
+
+        Args:
+            rows (iterable): Data rows from a csv.reader.
+            positions (dict): Column name to index, from the header row.
+            diagnostics (RowDiagnostics): Collects the rows that are skipped.
+            histogram (TrafficHistogram): Also counted in the same pass, as count_traffic
+                would count the rows, when given.
+        """
+        decoder = RowDecoder(sorted(positions, key=positions.get))
+        decode = decoder.decode
+        if histogram is not None:
+            junction_at = positions['JunctionName']
+            time_at = positions['timeOfDay']
+            time_field = decoder.names.index('timeOfDay')
+            histogram_row = histogram.row
+            bucket_seconds = histogram.bucket_seconds
+
+        counts = self.counts
+        total_vehicles = total_trucks = total_electric = two_wheeled = buses_north = 0
+        no_turns = over_speed_limit = elm_avenue_vehicles = hanley_highway_vehicles = 0
+        scooters_elm_avenue = 0
+        hanley_by_hour = self.hanley_by_hour
+        hanley_hour_order = self.hanley_hour_order
+        bicycles_by_hour = self.bicycles_by_hour
+        rain_by_hour = self.rain_by_hour
+        junction_vehicles = self.junction_vehicles
+        speed_counts = self.speed_counts
+        top_speed = SPEED_BINS - 1
+
+        for row in rows:
+            if not row:
+                continue  # Blank line
+            values = decode(row)
+            if histogram is not None:
+                # Histogram rows only need a junction and a valid time, whatever else is missing
+                if values is None:
+                    histogram.add_rows([row], junction_at, time_at)
+                elif values[time_field].__class__ is int:
+                    histogram_counts = histogram_row(row[junction_at])
+                    if histogram_counts is not None:
+                        histogram_counts[values[time_field] // bucket_seconds] += 1
+            if values is None or MISSING in values:
+                diagnostics.record("missing values", row, decoder.column_of(values, MISSING))
+                continue
+            junction, seconds, direction_in, direction_out, weather, limit, speed, vehicle_type, electric = values
+
+            total_vehicles += 1
+            if vehicle_type == "truck":
+                total_trucks += 1
+            if electric == "true":
+                total_electric += 1
+            if vehicle_type in TWO_WHEELED_TYPES:
+                two_wheeled += 1
+            if junction == ELM_AVENUE and vehicle_type == "buss" and direction_out.upper() == "N":
+                buses_north += 1
+            if direction_in == direction_out:
+                no_turns += 1
+
+            if speed is INVALID or limit is INVALID:
+                diagnostics.record("invalid speed", row, decoder.column_of(values, INVALID))
+                continue
+            if speed > limit:
+                over_speed_limit += 1
+            speed_counts[speed if 0 <= speed < top_speed else 0 if speed < 0 else top_speed] += 1
+
+            # The hour indexes the per-hour arrays, so it must be a real hour
+            if seconds is INVALID:
+                diagnostics.record("invalid time", row, "timeOfDay")
+                continue
+            hour = seconds // 3600
+
+            if junction == ELM_AVENUE:
+                elm_avenue_vehicles += 1
+                if vehicle_type == "scooter":
+                    scooters_elm_avenue += 1
+            elif junction == HANLEY_HIGHWAY:
+                hanley_highway_vehicles += 1
+                if not hanley_by_hour[hour]:
+                    hanley_hour_order.append(hour)
+                hanley_by_hour[hour] += 1
+            junction_vehicles[junction] = junction_vehicles.get(junction, 0) + 1
+
+            if vehicle_type == "bicycle":
+                bicycles_by_hour[hour] += 1
+            if weather == "rain":
+                rain_by_hour[hour] = True
+
+        counts["total_vehicles"] += total_vehicles
+        counts["total_trucks"] += total_trucks
+        counts["total_electric"] += total_electric
+        counts["two_wheeled"] += two_wheeled
+        counts["buses_north"] += buses_north
+        counts["no_turns"] += no_turns
+        counts["over_speed_limit"] += over_speed_limit
+        counts["elm_avenue_vehicles"] += elm_avenue_vehicles
+        counts["hanley_highway_vehicles"] += hanley_highway_vehicles
+        counts["scooters_elm_avenue"] += scooters_elm_avenue
+
+    def merge(self, other):
+        """
+        Adds the totals of another aggregate of the same survey into this one.
+
+        other must cover rows that come after this aggregate's rows in the file, so that
+        Hanley Highway hours keep their first-seen order.
+        """
+        for name, count in other.counts.items():
+            self.counts[name] += count
+        for hour in other.hanley_hour_order:
+            if not self.hanley_by_hour[hour]:
+                self.hanley_hour_order.append(hour)
+        for hour in range(24):
+            self.hanley_by_hour[hour] += other.hanley_by_hour[hour]
+            self.bicycles_by_hour[hour] += other.bicycles_by_hour[hour]
+            self.rain_by_hour[hour] = self.rain_by_hour[hour] or other.rain_by_hour[hour]
+        for junction, count in other.junction_vehicles.items():
+            self.junction_vehicles[junction] = self.junction_vehicles.get(junction, 0) + count
+        for speed, count in enumerate(other.speed_counts):
+            self.speed_counts[speed] += count
+
+    def to_dict(self):
+        """Returns the totals as plain JSON-serialisable values."""
+        return {
+            "counts": self.counts,
+            "hanley_by_hour": self.hanley_by_hour,
+            "hanley_hour_order": self.hanley_hour_order,
+            "bicycles_by_hour": self.bicycles_by_hour,
+            "rain_by_hour": self.rain_by_hour,
+            "junction_vehicles": self.junction_vehicles,
+            "speed_counts": self.speed_counts,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        aggregate = cls()
+        aggregate.counts.update(state["counts"])
+        aggregate.hanley_by_hour = state["hanley_by_hour"]
+        aggregate.hanley_hour_order = state["hanley_hour_order"]
+        aggregate.bicycles_by_hour = state["bicycles_by_hour"]
+        aggregate.rain_by_hour = state["rain_by_hour"]
+        aggregate.junction_vehicles = state["junction_vehicles"]
+        aggregate.speed_counts = state["speed_counts"]
+        return aggregate
+
+    def to_sketch(self, survey):
+        return TrafficSketch.from_tallies(survey, self.counts, self.hanley_by_hour, self.bicycles_by_hour,
+                                          self.rain_by_hour, self.speed_counts)
+
+    def to_outcomes(self, file_path):
+        hanley_traffic_by_hour = {f"{hour:02}": self.hanley_by_hour[hour] for hour in self.hanley_hour_order}
+        counts = dict(self.counts)
+        counts["bicycles"] = sum(self.bicycles_by_hour)
+        return build_outcomes(file_path, counts, hanley_traffic_by_hour, sum(self.rain_by_hour),
+                              self.to_sketch(survey_key(file_path)))
+
+
+# Mergeable survey state: raw tallies that add up across shards, days and machines
+SPEED_BINS = 128  # Speeds 0-126 are counted exactly; 127 and above share the last bin
+SKETCH_MAGIC = b"TVS1"
+SKETCH_SUFFIX = ".tvs"
+
+
+# Function to fold a {speed: vehicles} dict into the fixed speed bins of a TrafficSketch
+def bin_speeds(counts_by_speed):
+    speed_counts = [0] * SPEED_BINS
+    for speed, count in counts_by_speed.items():
+        speed_counts[min(max(speed, 0), SPEED_BINS - 1)] += count
+    return speed_counts
+
+
+# Function to turn {hour text: count} from the row-by-row engines into 24 hourly slots
+def hour_slots(by_hour):
+    slots = [0] * 24
+    for hour, count in by_hour.items():
+        try:
+            hour = int(hour)
+        except ValueError:
+            continue  # Not a real hour, so it has no slot
+        if 0 <= hour < 24:
+            slots[hour] += count
+    return slots
+
+
+# Function to name the survey a file holds: its ISO date, or its file name without one
+def survey_key(file_path):
+    survey_date = date_from_file_name(os.path.splitext(file_path)[0] + ".csv")
+    return survey_date.isoformat() if survey_date else os.path.basename(file_path)
+
+
+class TrafficSketch:
+    """
+    Raw tallies of one or more surveys that merge exactly, in any order.
+
+    Unlike the outcomes, which hold percentages, averages and peaks, everything here is a
+    sum: exact counters, vehicles per hour of the day, a histogram of speeds and, for each
+    survey, a 24-bit set of the hours with rain. Merging a week, a month or several
+    machines' results costs O(sketches), and the report is then derived from the merged
+    tallies. Merging two sketches of the same survey (such as two shards of one file) ORs
+    its rain hours, so shards and days can be combined freely.
+    """
+    def __init__(self):
+        self.counts = dict.fromkeys(COUNT_NAMES, 0)
+        self.hanley_by_hour = [0] * 24
+        self.bicycles_by_hour = [0] * 24
+        self.rain_hours = {}  # Survey key: bit h set when it rained during hour h
+        self.speed_counts = [0] * SPEED_BINS
+
+    @classmethod
+    def from_tallies(cls, survey, counts, hanley_by_hour, bicycles_by_hour, rain_by_hour, speed_counts):
+        """Builds the sketch of one survey from the tallies an engine has gathered."""
+        sketch = cls()
+        for name in COUNT_NAMES:
+            sketch.counts[name] = counts[name]
+        sketch.hanley_by_hour = list(hanley_by_hour)
+        sketch.bicycles_by_hour = list(bicycles_by_hour)
+        sketch.rain_hours[survey] = sum(1 << hour for hour in range(24) if rain_by_hour[hour])
+        sketch.speed_counts = list(speed_counts)
+        return sketch
+
+    def surveys(self):
+        return sorted(self.rain_hours)
+
+    def merge(self, other):
+        for name, count in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+        for hour in range(24):
+            self.hanley_by_hour[hour] += other.hanley_by_hour[hour]
+            self.bicycles_by_hour[hour] += other.bicycles_by_hour[hour]
+        for survey, hours in other.rain_hours.items():
+            self.rain_hours[survey] = self.rain_hours.get(survey, 0) | hours
+        for speed, count in enumerate(other.speed_counts):
+            self.speed_counts[speed] += count
+        return self
+
+    def speed_quantile(self, fraction):
+        """Returns the speed below which the given fraction of vehicles were recorded, or None."""
+        total = sum(self.speed_counts)
+        if not total:
+            return None
+        rank = max(1, -(-total * fraction // 1))  # Nearest rank, rounded up
+        seen = 0
+        for speed, count in enumerate(self.speed_counts):
+            seen += count
+            if seen >= rank:
+                return speed
+
+    def to_outcomes(self, label):
+        """Returns the outcomes of the merged surveys, with averages taken over all their hours."""
+        hanley_traffic_by_hour = {f"{hour:02}": count for hour, count in enumerate(self.hanley_by_hour) if count}
+        counts = dict(self.counts)
+        counts["bicycles"] = sum(self.bicycles_by_hour)
+        rain_hour_count = sum(bin(hours).count("1") for hours in self.rain_hours.values())
+        outcomes = build_outcomes(label, counts, hanley_traffic_by_hour, rain_hour_count,
+                                  hours=24 * max(len(self.rain_hours), 1))
+        outcomes["Surveys"] = self.surveys()
+        outcomes["Median Speed"] = self.speed_quantile(0.5)
+        outcomes["95th Percentile Speed"] = self.speed_quantile(0.95)
+        return outcomes
+
+    def to_dict(self):
+        return {"counts": self.counts, "hanley_by_hour": self.hanley_by_hour,
+                "bicycles_by_hour": self.bicycles_by_hour, "rain_hours": self.rain_hours,
+                "speed_counts": self.speed_counts}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls()
+        sketch.counts.update(state["counts"])
+        sketch.hanley_by_hour = list(state["hanley_by_hour"])
+        sketch.bicycles_by_hour = list(state["bicycles_by_hour"])
+        sketch.rain_hours = dict(state["rain_hours"])
+        sketch.speed_counts = list(state["speed_counts"])
+        return sketch
+
+    def to_bytes(self):
+        """Serialises the sketch as a magic number and a zlib-compressed body of a few hundred bytes."""
+        header = json.dumps({"counts": self.counts, "rain_hours": self.rain_hours},
+                            separators=(",", ":")).encode()
+        slots = array("q", self.hanley_by_hour + self.bicycles_by_hour + self.speed_counts)
+        if sys.byteorder != "little":
+            slots.byteswap()
+        return SKETCH_MAGIC + zlib.compress(struct.pack("<I", len(header)) + header + slots.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(SKETCH_MAGIC)] != SKETCH_MAGIC:
+            raise ValueError("Not a traffic sketch.")
+        body = zlib.decompress(data[len(SKETCH_MAGIC):])
+        (header_size,) = struct.unpack_from("<I", body)
+        header = json.loads(body[4:4 + header_size])
+        slots = array("q", body[4 + header_size:])
+        if sys.byteorder != "little":
+            slots.byteswap()
+        sketch = cls()
+        sketch.counts.update(header["counts"])
+        sketch.rain_hours = header["rain_hours"]
+        sketch.hanley_by_hour = slots[:24].tolist()
+        sketch.bicycles_by_hour = slots[24:48].tolist()
+        sketch.speed_counts = slots[48:].tolist()
+        return sketch
+
+
+# Function to merge any number of sketches into a new one
+def merge_sketches(sketches):
+    merged = TrafficSketch()
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+# Function to store the sketch of one survey as <survey>.tvs in a folder
+def save_sketch(sketch, directory, survey=None):
+    os.makedirs(directory, exist_ok=True)
+    file_name = os.path.join(directory, (survey or "-".join(sketch.surveys())) + SKETCH_SUFFIX)
+    with atomic_write(file_name, "wb") as file:
+        file.write(sketch.to_bytes())
+    return file_name
+
+
+# Function to merge the stored sketches in a folder, optionally within a date range
+@instrumented("process")
+def rollup_sketches(directory, start_date=None, end_date=None):
+    """
+    Merges the .tvs files saved by batch runs into one sketch.
+
+    Files named after an ISO date outside start_date..end_date are left out; files of
+    surveys without a date are only included when no range is given.
+    """
+    sketches = []
+    for file_name in sorted(glob.glob(os.path.join(directory, "*" + SKETCH_SUFFIX))):
+        survey = os.path.basename(file_name)[:-len(SKETCH_SUFFIX)]
+        if start_date is not None or end_date is not None:
+            try:
+                survey_date = datetime.strptime(survey, "%Y-%m-%d").date()
+            except ValueError:
+                continue
+            if (start_date is not None and survey_date < start_date
+                    or end_date is not None and survey_date > end_date):
+                continue
+        try:
+            with open(file_name, "rb") as file:
+                sketches.append(TrafficSketch.from_bytes(file.read()))
+        except (OSError, ValueError, zlib.error) as e:
+            print(f"Skipping unreadable sketch '{file_name}': {e}")
+    record_rows(rows=len(sketches))
+    return merge_sketches(sketches)
+
+
+# Function to read text lines from a file in fixed-size byte chunks
+def read_lines_in_chunks(file, chunk_size=STREAM_CHUNK_SIZE, size=None):
+    remainder = b""
+    while size is None or size > 0:
+        chunk = file.read(chunk_size if size is None else min(chunk_size, size))
+        if not chunk:
+            break
+        if size is not None:
+            size -= len(chunk)  # Stop at the end of a byte range
+        complete, newline, remainder = (remainder + chunk).rpartition(b"\n")
+        if newline:
+            yield from (complete + newline).decode().splitlines(True)
+    if remainder:
+        yield remainder.decode()
+
+
+# Streaming engine: constant memory however large the file is
+def process_csv_stream(file_path, chunk_size=STREAM_CHUNK_SIZE, diagnostics=None, quarantine=None,
+                       histogram=None):
+    """
+    Calculates the outcomes of process_csv_data without holding the file in memory.
+
+    Rows are parsed as lists by csv.reader and folded into a TrafficAggregate, so memory
+    stays bounded by the chunk size. Skipped rows are counted and sampled in diagnostics
+    rather than printed one by one, and saved to the quarantine file if one is given.
+    A TrafficHistogram passed as histogram is counted in the same pass.
+    """
+    if diagnostics is None:
+        diagnostics = RowDiagnostics(quarantine=Quarantine(quarantine) if quarantine else None)
+    aggregate = TrafficAggregate()
+
+    if file_path.endswith(COLUMNAR_SUFFIX):
+        columns = TrafficColumns(file_path)  # Already bounded: rows are decoded one at a time
+        require_columns(columns.fieldnames)
+        aggregate.add_rows(columns.iter_rows(), columns.positions, diagnostics, histogram)
+        fieldnames = columns.fieldnames
+    else:
+        with open(file_path, mode="rb") as file:
+            csv_reader = csv.reader(read_lines_in_chunks(file, chunk_size))
+            fieldnames = next(csv_reader, [])
+            require_columns(fieldnames)
+            positions = {name: i for i, name in enumerate(fieldnames)}
+            aggregate.add_rows(csv_reader, positions, diagnostics, histogram)
+
+    diagnostics.report()
+    if diagnostics.quarantine is not None:
+        diagnostics.quarantine.save(fieldnames)
+    record_aggregate_rows(aggregate.counts["total_vehicles"], diagnostics)
+    return aggregate.to_outcomes(file_path)
+
+
+# Incremental analysis: a survey file that keeps growing is only read from where it was left
+TAIL_CHECK_SIZE = 4096  # Bytes before the saved offset re-read to detect a rewritten file
+
+
+# Function to find the end of the last complete line between start and end
+def last_line_end(file, start, end, block_size=1 << 16):
+    position = end
+    while position > start:
+        block_start = max(start, position - block_size)
+        file.seek(block_start)
+        newline = file.read(position - block_start).rfind(b"\n")
+        if newline >= 0:
+            return block_start + newline + 1
+        position = block_start
+    return start
+
+
+class IncrementalAnalysis:
+    """
+    Keeps the running totals of one survey CSV between refreshes.
+
+    Each refresh reads only the complete lines appended since the previous one, so its cost
+    follows the new data rather than the file size; a line still being written is left for
+    the next refresh. A last line without a newline is counted once the file's size and
+    modification time are unchanged since the previous refresh, or at once when the refresh
+    is told the file is final. If the file was replaced, truncated, or its header or the
+    bytes just before the saved offset have changed, the totals are thrown away and the file
+    is scanned again from the start.
+
+    Args:
+        file_path (str): The CSV file to follow.
+        state_path (str): A JSON file to keep the state in between runs, or None to keep it
+            in memory only.
+    """
+    def __init__(self, file_path, state_path=None):
+        self.file_path = file_path
+        self.state_path = state_path
+        self.reset()
+        if state_path is not None:
+            self.load_state()
+
+    def reset(self):
+        self.file_id = None
+        self.header = None
+        self.offset = 0
+        self.tail_digest = None
+        self.unfinished = None  # [size, mtime_ns] when the file last ended in an incomplete line
+        self.aggregate = TrafficAggregate()
+        self.diagnostics = RowDiagnostics()
+
+    def load_state(self):
+        try:
+            with open(self.state_path, "r") as file:
+                state = json.load(file)
+            if state["file_path"] != os.path.abspath(self.file_path):
+                return
+            self.file_id = state["file_id"]
+            self.header = state["header"]
+            self.offset = state["offset"]
+            self.tail_digest = state["tail_digest"]
+            self.unfinished = state.get("unfinished")
+            self.aggregate = TrafficAggregate.from_dict(state["aggregate"])
+            self.diagnostics = RowDiagnostics.from_dict(state["diagnostics"])
+        except (OSError, ValueError, KeyError):
+            self.reset()  # No usable state: start from the beginning
+
+    def save_state(self):
+        state = {
+            "file_path": os.path.abspath(self.file_path),
+            "file_id": self.file_id,
+            "header": self.header,
+            "offset": self.offset,
+            "tail_digest": self.tail_digest,
+            "unfinished": self.unfinished,
+            "aggregate": self.aggregate.to_dict(),
+            "diagnostics": self.diagnostics.to_dict(),
+        }
+        with atomic_write(self.state_path) as file:
+            json.dump(state, file)
+
+    def tail_of(self, file, offset):
+        file.seek(max(len(self.header.encode()), offset - TAIL_CHECK_SIZE))
+        return hashlib.sha1(file.read(offset - file.tell())).hexdigest()
+
+    def is_unchanged(self, file, stat):
+        if self.header is None:
+            return True  # Nothing read yet
+        if [stat.st_dev, stat.st_ino] != self.file_id or stat.st_size < self.offset:
+            return False
+        file.seek(0)
+        if file.readline().decode() != self.header:
+            return False
+        return self.tail_of(file, self.offset) == self.tail_digest
+
+    @instrumented("process")
+    def refresh(self, final=False):
+        """
+        Folds in the newly appended rows and returns the outcomes for the whole file.
+
+        Args:
+            final (bool): The file is complete, so a last line without a newline is counted now.
+        """
+        new_diagnostics = RowDiagnostics()
+        vehicles_before = self.aggregate.counts["total_vehicles"]
+        with open(self.file_path, mode="rb") as file:
+            stat = os.fstat(file.fileno())
+            if not self.is_unchanged(file, stat):
+                print(f"'{self.file_path}' was rewritten - analysing it from the start.")
+                self.reset()
+
+            if self.header is None:
+                file.seek(0)
+                header = file.readline()
+                if not header.endswith(b"\n"):
+                    return self.aggregate.to_outcomes(self.file_path)  # Header not complete yet
+                fieldnames = next(csv.reader([header.decode()]), [])
+                require_columns(fieldnames)
+                self.header = header.decode()
+                self.offset = len(header)
+                self.file_id = [stat.st_dev, stat.st_ino]
+
+            end = last_line_end(file, self.offset, stat.st_size)
+            if end < stat.st_size:
+                # The file ends mid-line: count the line once nothing has been written since the last look
+                unfinished = [stat.st_size, stat.st_mtime_ns]
+                if final or unfinished == self.unfinished:
+                    end = stat.st_size
+                    unfinished = None
+                self.unfinished = unfinished
+            else:
+                self.unfinished = None
+            if end > self.offset:
+                fieldnames = next(csv.reader([self.header]))
+                positions = {name: i for i, name in enumerate(fieldnames)}
+                file.seek(self.offset)
+                csv_reader = csv.reader(read_lines_in_chunks(file, size=end - self.offset))
+                self.aggregate.add_rows(csv_reader, positions, new_diagnostics)
+                self.offset = end
+            self.tail_digest = self.tail_of(file, self.offset)
+
+        new_diagnostics.report()
+        record_aggregate_rows(self.aggregate.counts["total_vehicles"] - vehicles_before, new_diagnostics)
+        self.diagnostics.merge(new_diagnostics)
+        if self.state_path is not None:
+            self.save_state()
+        return self.aggregate.to_outcomes(self.file_path)
+
+
+# Batch analysis: many files, and byte-range shards of large files, across worker processes
+BATCH_SHARD_SIZE = 64 << 20  # Bytes of CSV given to one worker task
+TRAFFIC_FILE_PATTERN = re.compile(r"traffic_data(\d{2})(\d{2})(\d{4})\.csv$")
+
+
+# Function to read the survey date from a traffic_dataDDMMYYYY.csv file name
+def date_from_file_name(file_path):
+    match = TRAFFIC_FILE_PATTERN.search(os.path.basename(file_path))
+    if match is None:
+        return None
+    day, month, year = match.groups()
+    try:
+        return datetime(int(year), int(month), int(day)).date()
+    except ValueError:
+        return None
+
+
+# Function to list the traffic data files in a directory, optionally within a date range
+def find_traffic_files(directory, start_date=None, end_date=None):
+    """
+    Returns the traffic_data*.csv files in directory, in date order.
+
+    Args:
+        directory (str): The folder to search.
+        start_date (date): The first survey date to include, or None for no lower bound.
+        end_date (date): The last survey date to include, or None for no upper bound.
+    """
+    dated_files = []
+    for file_path in glob.glob(os.path.join(directory, "traffic_data*.csv")):
+        survey_date = date_from_file_name(file_path)
+        if survey_date is None:
+            continue
+        if start_date is not None and survey_date < start_date:
+            continue
+        if end_date is not None and survey_date > end_date:
+            continue
+        dated_files.append((survey_date, file_path))
+    return [file_path for _, file_path in sorted(dated_files)]
+
+
+# Function to split a CSV into line-aligned byte ranges after the header row
+def plan_shards(file_path, shard_size=BATCH_SHARD_SIZE):
+    """
+    Reads the header row and cuts the rest of the file into byte ranges of about shard_size.
+
+    Each boundary is moved forward to the start of the next line, so every data row falls in
+    exactly one range. Rows are assumed not to contain quoted line breaks, which traffic data
+    files never do. Returns the column positions and a list of (start, end) offsets.
+    """
+    with open(file_path, mode="rb") as file:
+        header = file.readline()
+        fieldnames = next(csv.reader([header.decode()]), [])
+        require_columns(fieldnames)
+        file_size = os.fstat(file.fileno()).st_size
+
+        boundaries = [len(header)]
+        while boundaries[-1] < file_size:
+            file.seek(boundaries[-1] + shard_size)
+            file.readline()  # Finish the line the cut falls in
+            boundaries.append(min(file.tell(), file_size))
+
+    positions = {name: i for i, name in enumerate(fieldnames)}
+    return positions, list(zip(boundaries, boundaries[1:]))
+
+
+# Worker task: aggregate the rows in one byte range of a file
+def aggregate_shard(file_path, start, end, positions, chunk_size=STREAM_CHUNK_SIZE):
+    diagnostics = RowDiagnostics()
+    aggregate = TrafficAggregate()
+    with open(file_path, mode="rb") as file:
+        file.seek(start)
+        csv_reader = csv.reader(read_lines_in_chunks(file, chunk_size, end - start))
+        aggregate.add_rows(csv_reader, positions, diagnostics)
+    return aggregate, diagnostics
+
+
+# Function to aggregate many traffic data files in parallel
+@instrumented("process")
+def analyse_batch(file_paths, workers=None, shard_size=BATCH_SHARD_SIZE):
+    """
+    Aggregates every file, fanning the shards of all files out over a process pool.
+
+    Small files are a single shard; large files are split so that one big day does not
+    leave the other workers idle. Shard results are merged back in file order.
+
+    Args:
+        file_paths (list): The traffic data CSVs to analyse.
+        workers (int): Worker processes, defaulting to the number of CPUs. With 1 the
+            shards run in this process.
+        shard_size (int): Approximate bytes of CSV per worker task.
+
+    Returns:
+        dict: For each file that could be read, its (TrafficAggregate, RowDiagnostics).
+    """
+    plans = {}
+    for file_path in file_paths:
+        try:
+            plans[file_path] = plan_shards(file_path, shard_size)
+        except FileNotFoundError:
+            print(f"Error: File not found - '{file_path}'")
+        except KeyError as e:
+            print(f"Error in '{file_path}': {e}")
+
+    tasks = [(file_path, start, end, positions)
+             for file_path, (positions, shards) in plans.items()
+             for start, end in shards]
+    if workers == 1:
+        shard_results = [aggregate_shard(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shard_results = list(executor.map(aggregate_shard, *zip(*tasks))) if tasks else []
+
+    results = {file_path: (TrafficAggregate(), RowDiagnostics()) for file_path in plans}
+    all_diagnostics = RowDiagnostics()
+    vehicles = 0
+    for (file_path, *_), (aggregate, diagnostics) in zip(tasks, shard_results):
+        results[file_path][0].merge(aggregate)
+        results[file_path][1].merge(diagnostics)
+        all_diagnostics.merge(diagnostics)
+        vehicles += aggregate.counts["total_vehicles"]
+    record_aggregate_rows(vehicles, all_diagnostics)
+    return results
+
+
+# Function to add the survey date and the skipped row count to the outcomes of a batch file
+def batch_outcomes(file_path, aggregate, diagnostics):
+    outcomes = aggregate.to_outcomes(file_path)
+    survey_date = date_from_file_name(file_path)
+    outcomes["Date"] = survey_date.strftime("%d/%m/%Y") if survey_date else ""
+    outcomes["Skipped Rows"] = diagnostics.total()
+    return outcomes
+
+
+# Function to write one report row per day, with vehicle counts for every junction
+@instrumented("write")
+def save_batch_report(results, file_name="batch_report.csv"):
+    """
+    Saves the outcomes of a batch run as a CSV with one row per survey date.
+
+    Args:
+        results (dict): The output of analyse_batch.
+        file_name (str): The report file to write. Default is 'batch_report.csv'.
+    """
+    junctions = []
+    for aggregate, _ in results.values():
+        junctions += [name for name in aggregate.junction_vehicles if name not in junctions]
+    columns = BATCH_FIELDS
+
+    try:
+        with open(file_name, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(columns + [f"Vehicles {junction}" for junction in junctions])
+            for file_path, (aggregate, diagnostics) in results.items():
+                outcomes = batch_outcomes(file_path, aggregate, diagnostics)
+                outcomes["Peak Traffic Hours"] = "; ".join(outcomes["Peak Traffic Hours"])
+                writer.writerow([outcomes[column] for column in columns]
+                                + [aggregate.junction_vehicles.get(junction, 0) for junction in junctions])
+        print(f"Batch report saved to {file_name} successfully.")
+    except OSError as e:
+        print(f"Error saving batch report: {e}")
+
+
+# Non-interactive entry point: analyse a folder of surveys and write the merged report
+def run_batch(directory, start_date=None, end_date=None, workers=None,
+              shard_size=BATCH_SHARD_SIZE, report_file="batch_report.csv", sketch_dir=None,
+              results_file=None, rotate_bytes=None):
+    file_paths = find_traffic_files(directory, start_date, end_date)
+    if not file_paths:
+        print("No traffic data files found for the selected dates.")
+        return {}
+    print(f"Analysing {len(file_paths)} data files...")
+    results = analyse_batch(file_paths, workers, shard_size)
+    for file_path, (_, diagnostics) in results.items():
+        if diagnostics.total():
+            print(f"{file_path}:")
+            diagnostics.report()
+    save_batch_report(results, report_file)
+    if results_file:
+        try:
+            with ResultsWriter(results_file, BATCH_FIELDS, max_bytes=rotate_bytes) as writer:
+                for file_path, (aggregate, diagnostics) in results.items():
+                    writer.write(batch_outcomes(file_path, aggregate, diagnostics))
+            print(f"Saved {writer.written} results to {results_file}.")
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"Error saving results to {results_file}: {e}")
+    if sketch_dir:
+        for file_path, (aggregate, _) in results.items():
+            survey = survey_key(file_path)
+            save_sketch(aggregate.to_sketch(survey), sketch_dir, survey)
+        print(f"Saved {len(results)} survey sketches to {sketch_dir}.")
+    return results
+
+
+# Function to show the report merged from stored sketches
+def display_rollup(sketch):
+    if not sketch.rain_hours:
+        print("No survey sketches found for the selected dates.")
+        return
+    outcomes = sketch.to_outcomes(f"{len(sketch.rain_hours)} surveys")
+    surveys = outcomes["Surveys"]
+    print(f"\nRollup of {len(surveys)} surveys from {surveys[0]} to {surveys[-1]}")
+    display_outcomes(outcomes)
+    print(f"The median vehicle speed is {outcomes['Median Speed']}, "
+          f"and 95% of vehicles were recorded at or below {outcomes['95th Percentile Speed']}")
+
+
+# Results: each report is built once as a record; the text report is derived from it
+RESULT_FIELDS = ["File Name", "Total Vehicles", "Total Trucks", "Total Electric Vehicles",
+                 "Two-Wheeled Vehicles", "Buses North", "Vehicles No Turns", "Trucks Percentage",
+                 "Average Bicycles Per Hour", "Over Speed Limit", "Elm Avenue Vehicles",
+                 "Hanley Highway Vehicles", "Scooters Percentage Elm", "Peak Traffic Count",
+                 "Peak Traffic Hours", "Rain Hours"]
+BATCH_FIELDS = ["Date"] + RESULT_FIELDS + ["Skipped Rows"]  # Columns of the batch report
+RESULT_LINES = [
+    "",
+    "***************************",
+    "Data file selected is {File Name}",
+    "***************************",
+    "The total number of vehicles recorded for this date is {Total Vehicles}",
+    "The total number of trucks recorded for this date is {Total Trucks}",
+    "The total number of electric vehicles for this date is {Total Electric Vehicles}",
+    "The total number of two-wheeled vehicles for this date is {Two-Wheeled Vehicles}",
+    "The total number of Buses leaving Elm Avenue/Rabbit Road heading North is {Buses North}",
+    "The total number of Vehicles through both junctions not turning left or right is {Vehicles No Turns}",
+    "The percentage of total vehicles recorded that are trucks for this date is {Trucks Percentage}%",
+    "The average number of Bikes per hour for this date is {Average Bicycles Per Hour}",
+    "",
+    "The total number of Vehicles recorded as over the speed limit for this date is {Over Speed Limit}",
+    "The total number of vehicles recorded through Elm Avenue/Rabbit Road junction is {Elm Avenue Vehicles}",
+    "The total number of vehicles recorded through Hanley Highway/Westway junction is {Hanley Highway Vehicles}",
+    "{Scooters Percentage Elm}% of vehicles recorded through Elm Avenue/Rabbit Road are scooters.",
+    "",
+    "The highest number of vehicles in an hour on Hanley Highway/Westway is {Peak Traffic Count}",
+    "The most vehicles through Hanley Highway/Westway were recorded {Peak Traffic Hours}",
+    "The number of hours of rain for this date is {Rain Hours}",
+]
+RESULT_FORMATS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv",
+                  ".db": "sqlite", ".sqlite": "sqlite", ".sqlite3": "sqlite"}
+
+
+# Function to pick the fields of a report out of an outcomes dictionary
+def result_record(outcomes, fields=RESULT_FIELDS):
+    return {field: outcomes.get(field, "") for field in fields}
+
+
+# Function to render outcomes as the lines of the human-readable report
+def format_outcomes(outcomes):
+    values = dict(outcomes)
+    values["Peak Traffic Hours"] = ", ".join(outcomes["Peak Traffic Hours"])
+    return [line.format_map(values) for line in RESULT_LINES]
+
+
+class ResultsWriter:
+    """
+    Buffers report records and writes them to a file in large batches.
+
+    The format follows the file name: JSON Lines (.jsonl), CSV (.csv), SQLite (.db, .sqlite)
+    with one transaction per batch, or the human-readable text report for anything else.
+    Records are written once batch_size are waiting, and on flush or close. When the file
+    grows past max_bytes it is renamed to <file>.1 (older copies moving up to <file>.backups)
+    and a new file is started, so a reader always sees whole files. Appending to a CSV or
+    database whose columns are not fields raises ValueError rather than mixing layouts.
+
+    Args:
+        file_name (str): The file to append the records to.
+        fields (list): The outcomes keys written for each record. Default is RESULT_FIELDS.
+        batch_size (int): Records kept in memory before they are written.
+        max_bytes (int): Size at which the file is rotated, or None to let it grow.
+        backups (int): Rotated files to keep.
+    """
+    def __init__(self, file_name, fields=RESULT_FIELDS, batch_size=1000, max_bytes=None, backups=5):
+        self.file_name = file_name
+        self.fields = list(fields)
+        self.format = RESULT_FORMATS.get(os.path.splitext(file_name)[1].lower(), "text")
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.pending = []
+        self.written = 0
+        self.connection = None
+        if self.format == "sqlite":
+            self.open_database()
+        elif self.format == "csv":
+            self.check_columns(self.read_csv_header())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open_database(self):
+        columns = ", ".join(f'"{field}"' for field in self.fields)
+        self.connection = sqlite3.connect(self.file_name)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS results ({columns})")
+        self.insert = f"INSERT INTO results VALUES ({', '.join('?' * len(self.fields))})"
         try:
-            user_input = input(prompt)
-            value = value_type(user_input)  # Convert input to correct type
-            if min_value is not None and value < min_value:
-                print(f"Out of range - value must be in the range {min_value} to {max_value}.")
-                continue
-            if max_value is not None and value > max_value:
-                print(f"Out of range - value must be in the range {min_value} to {max_value}.")
-                continue
-            return value  # Valid input
+            self.check_columns([row[1] for row in self.connection.execute("PRAGMA table_info(results)")])
         except ValueError:
-            print(f"Integer required.")
-
-# Function to get a valid date input from the user
-def get_valid_date():
-    day = validate_in("Please enter the day of the survey in the format dd: ", int, 1, 31)
-    month = validate_in("Please enter the month of the survey in the format MM: ", int, 1, 12)
-    year = validate_in("Please enter the year of the survey in the format YYYY: ", int, 2000, 2024)
+            self.connection.close()
+            self.connection = None
+            raise
 
-    # Month-specific validations
-    if month == 2:
-        if is_leap_year(year):
-            if day > 29:
-                print("February can only have 29 days in a leap year.")
-                return get_valid_date()  # Ask again
-        else:
-            if day > 28:
-                print("February can only have 28 days in a non-leap year.")
-                return get_valid_date()  # Ask again
-    elif month in [4, 6, 9, 11] and day > 30:  # April, June, September, November
-        print(f"Month {month} can only have 30 days.")
-        return get_valid_date()  # Ask again
+    def read_csv_header(self):
+        try:
+            with open(self.file_name, newline="") as file:
+                return next(csv.reader(file), None)
+        except FileNotFoundError:
+            return None  # A new file gets its header on the first write
 
-    return f"{day:02}/{month:02}/{year}"
+    def check_columns(self, columns):
+        if columns is not None and columns != self.fields:
+            raise ValueError(f"'{self.file_name}' holds records with other columns; "
+                             f"write these results to a new file.")
 
-# Task B: Process the CSV data and calculate traffic statistics
-def process_csv_data(file_path):
-    outcomes = {}
+    def write(self, outcomes):
+        self.pending.append(result_record(outcomes, self.fields))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
 
-    required_columns = {"VehicleType", "elctricHybrid", "JunctionName", "VehicleSpeed",
-                        "JunctionSpeedLimit", "timeOfDay", "Weather_Conditions",
-                        "travel_Direction_in", "travel_Direction_out"}
+    def flush(self):
+        if not self.pending:
+            return
+        records = self.pending  # Kept until written, so a failed write loses nothing
+        if self.format == "sqlite":
+            with self.connection:  # One transaction for the whole batch
+                self.connection.executemany(self.insert, (
+                    [json.dumps(value) if isinstance(value, (list, dict)) else value for value in record.values()]
+                    for record in records))
+        else:
+            with open(self.file_name, "a", newline="" if self.format == "csv" else None) as file:
+                if self.format == "jsonl":
+                    file.write("".join(json.dumps(record) + "\n" for record in records))
+                elif self.format == "csv":
+                    writer = csv.writer(file)
+                    if file.tell() == 0:
+                        writer.writerow(self.fields)
+                    writer.writerows([
+                        "; ".join(value) if isinstance(value, list) else value for value in record.values()]
+                        for record in records)
+                else:
+                    file.write("".join("\n".join(format_outcomes(record)) + "\n\n" for record in records))
+        self.pending = []
+        self.written += len(records)
+        if self.max_bytes is not None and os.path.getsize(self.file_name) >= self.max_bytes:
+            self.rotate()
 
-    try:
-        with open(file_path, mode="r") as file:
-            csv_reader = csv.DictReader(file)
-
-            if not required_columns.issubset(csv_reader.fieldnames):
-                missing = required_columns - set(csv_reader.fieldnames)
-                raise KeyError(f"Missing expected columns: {', '.join(missing)}")
-
-            # Initialize counters
-            total_vehicles = 0
-            total_trucks = 0
-            total_electric = 0
-            two_wheeled = 0
-            buses_north = 0
-            no_turns = 0
-            over_speed_limit = 0
-            elm_avenue_vehicles = 0
-            hanley_highway_vehicles = 0
-            scooters_elm_avenue = 0
-            bicycles_per_hour = {}
-            hanley_traffic_by_hour = {}
-            rain_hours = set()
-
-            for row in csv_reader:
-                try:
-                    if not all(row[col].strip() for col in required_columns):
-                        print(f"Skipping row with missing values: {row}")
-                        continue
-
-                    total_vehicles += 1
-
-                    # Count trucks
-                    if row["VehicleType"].strip().lower() == "truck":
-                        total_trucks += 1
-
-                    # Count electric vehicles
-                    if row["elctricHybrid"].strip().lower() == "true":
-                        total_electric += 1
-
-                    # Count two-wheeled vehicles
-                    vehicle_type = row["VehicleType"].strip().lower()
-                    if vehicle_type in ["bicycle", "motorbike", "scooter", "motorcycle"]:
-                        two_wheeled += 1
-
-                    # Count buses heading North from Elm Avenue
-                    if row["JunctionName"] == "Elm Avenue/Rabbit Road" and row["travel_Direction_out"].upper() == "N" and row["VehicleType"].strip().lower() == "buss":
-                        buses_north += 1
-
-                    # Count vehicles not turning
-                    if row["travel_Direction_in"] == row["travel_Direction_out"]:
-                        no_turns += 1
-
-                    # Count vehicles over speed limit
-                    try:
-                        if int(row["VehicleSpeed"]) > int(row["JunctionSpeedLimit"]):
-                            over_speed_limit += 1
-                    except ValueError:
-                        print(f"Invalid speed data in row: {row}")
-                        continue
-
-                    # Count vehicles by junction
-                    if row["JunctionName"] == "Elm Avenue/Rabbit Road":
-                        elm_avenue_vehicles += 1
-                        if vehicle_type == "scooter":
-                            scooters_elm_avenue += 1
-                    elif row["JunctionName"] == "Hanley Highway/Westway":
-                        hanley_highway_vehicles += 1
-                        hour = row["timeOfDay"].split(":")[0]
-                        hanley_traffic_by_hour[hour] = hanley_traffic_by_hour.get(hour, 0) + 1
-
-                    # Count bicycles per hour
-                    if vehicle_type == "bicycle":
-                        hour = row["timeOfDay"].split(":")[0]
-                        bicycles_per_hour[hour] = bicycles_per_hour.get(hour, 0) + 1
-
-                    # Count rain hours
-                    if row["Weather_Conditions"].strip().lower() == "rain":
-                        hour = row["timeOfDay"].split(":")[0]
-                        rain_hours.add(hour)
-
-                except KeyError as e:
-                    print(f"Skipping row due to missing column: {e}")
-                    continue
+    def rotate(self):
+        if self.connection is not None:
+            self.connection.close()
+        if self.backups:
+            for number in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.file_name}.{number}"):
+                    os.replace(f"{self.file_name}.{number}", f"{self.file_name}.{number + 1}")
+            os.replace(self.file_name, f"{self.file_name}.1")  # A single atomic rename
+        else:
+            os.remove(self.file_name)
+        if self.connection is not None:
+            self.open_database()
 
-            # Store outcomes
-            outcomes["File Name"] = file_path
-            outcomes["Total Vehicles"] = total_vehicles
-            outcomes["Total Trucks"] = total_trucks
-            outcomes["Total Electric Vehicles"] = total_electric
-            outcomes["Two-Wheeled Vehicles"] = two_wheeled
-            outcomes["Buses North"] = buses_north
-            outcomes["Vehicles No Turns"] = no_turns
-            outcomes["Trucks Percentage"] = round((total_trucks / total_vehicles) * 100) if total_vehicles else 0
-            outcomes["Average Bicycles Per Hour"] = round(sum(bicycles_per_hour.values()) / 24) if bicycles_per_hour else 0
-            outcomes["Over Speed Limit"] = over_speed_limit
-            outcomes["Elm Avenue Vehicles"] = elm_avenue_vehicles
-            outcomes["Hanley Highway Vehicles"] = hanley_highway_vehicles
-            outcomes["Scooters Percentage Elm"] = round((scooters_elm_avenue / elm_avenue_vehicles) * 100) if elm_avenue_vehicles else 0
-            outcomes["Peak Traffic Count"] = max(hanley_traffic_by_hour.values(), default=0)
-            outcomes["Peak Traffic Hours"] = [
-                f"Between {int(hour):02}:00 and {int(hour)+1}:00"
-                for hour, count in hanley_traffic_by_hour.items()
-                if count == outcomes["Peak Traffic Count"]
-            ]
-            outcomes["Rain Hours"] = len(rain_hours)
-            outcomes["HanleyTrafficByHour"] = hanley_traffic_by_hour
-
-            return outcomes
+    def close(self):
+        self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
 
-    except FileNotFoundError:
-        print(f"Error: File not found - '{file_path}'")
-    except KeyError as e:
-        print(f"Error: {e}")
-    return outcomes
 
 # Task C: Display results in the required format
 def display_outcomes(outcomes):
     if not outcomes:  # Check for empty or error-flagged outcomes
         print("No valid data to display.")
         return
-
-    print("\n***************************")
-    print(f"Data file selected is {outcomes['File Name']}")
-    print("***************************")
-    print(f"The total number of vehicles recorded for this date is {outcomes['Total Vehicles']}")
-    print(f"The total number of trucks recorded for this date is {outcomes['Total Trucks']}")
-    print(f"The total number of electric vehicles for this date is {outcomes['Total Electric Vehicles']}")
-    print(f"The total number of two-wheeled vehicles for this date is {outcomes['Two-Wheeled Vehicles']}")
-    print(f"The total number of Buses leaving Elm Avenue/Rabbit Road heading North is {outcomes['Buses North']}")
-    print(f"The total number of Vehicles through both junctions not turning left or right is {outcomes['Vehicles No Turns']}")
-    print(f"The percentage of total vehicles recorded that are trucks for this date is {outcomes['Trucks Percentage']}%")
-    print(f"The average number of Bikes per hour for this date is {outcomes['Average Bicycles Per Hour']}")
-    print()
-    print(f"The total number of Vehicles recorded as over the speed limit for this date is {outcomes['Over Speed Limit']}")
-    print(f"The total number of vehicles recorded through Elm Avenue/Rabbit Road junction is {outcomes['Elm Avenue Vehicles']}")
-    print(f"The total number of vehicles recorded through Hanley Highway/Westway junction is {outcomes['Hanley Highway Vehicles']}")
-    print(f"{outcomes['Scooters Percentage Elm']}% of vehicles recorded through Elm Avenue/Rabbit Road are scooters.")
-    print()
-    print(f"The highest number of vehicles in an hour on Hanley Highway/Westway is {outcomes['Peak Traffic Count']}")
-    print(f"The most vehicles through Hanley Highway/Westway were recorded {', '.join(outcomes['Peak Traffic Hours'])}")
-    print(f"The number of hours of rain for this date is {outcomes['Rain Hours']}")
+    print("\n".join(format_outcomes(outcomes)))
 
 # Function to save outcomes to a text file
+@instrumented("write")
 def save_results_to_file(outcomes, file_name="results.txt"):
     """
-    Saves the processed outcomes to a text file.
+    Appends the processed outcomes to a results file.
 
     Args:
         outcomes (dict): The dictionary containing processed traffic data.
-        file_name (str): The name of the text file to save results. Default is 'results.txt'.
+        file_name (str): The file to save results to. Default is 'results.txt'; a .jsonl,
+            .csv or .db name saves a structured record instead (see ResultsWriter).
     """
     try:
-        with open(file_name, "a") as file:  # Open the file in append mode
-            file.write("\n***************************\n")
-            file.write(f"Data file selected is {outcomes['File Name']}\n")
-            file.write("***************************\n")
-            file.write(f"The total number of vehicles recorded for this date is {outcomes['Total Vehicles']}\n")
-            file.write(f"The total number of trucks recorded for this date is {outcomes['Total Trucks']}\n")
-            file.write(f"The total number of electric vehicles for this date is {outcomes['Total Electric Vehicles']}\n")
-            file.write(f"The total number of two-wheeled vehicles for this date is {outcomes['Two-Wheeled Vehicles']}\n")
-            file.write(f"The total number of Buses leaving Elm Avenue/Rabbit Road heading North is {outcomes['Buses North']}\n")
-            file.write(f"The total number of Vehicles through both junctions not turning left or right is {outcomes['Vehicles No Turns']}\n")
-            file.write(f"The percentage of total vehicles recorded that are trucks for this date is {outcomes['Trucks Percentage']}%\n")
-            file.write(f"The average number of Bikes per hour for this date is {outcomes['Average Bicycles Per Hour']}\n")
-            file.write("\n")
-            file.write(f"The total number of Vehicles recorded as over the speed limit for this date is {outcomes['Over Speed Limit']}\n")
-            file.write(f"The total number of vehicles recorded through Elm Avenue/Rabbit Road junction is {outcomes['Elm Avenue Vehicles']}\n")
-            file.write(f"The total number of vehicles recorded through Hanley Highway/Westway junction is {outcomes['Hanley Highway Vehicles']}\n")
-            file.write(f"{outcomes['Scooters Percentage Elm']}% of vehicles recorded through Elm Avenue/Rabbit Road are scooters.\n")
-            file.write("\n")
-            file.write(f"The highest number of vehicles in an hour on Hanley Highway/Westway is {outcomes['Peak Traffic Count']}\n")
-            file.write(f"The most vehicles through Hanley Highway/Westway were recorded {', '.join(outcomes['Peak Traffic Hours'])}\n")
-            file.write(f"The number of hours of rain for this date is {outcomes['Rain Hours']}\n")
-            file.write("\n")
-            print("Results saved to results.txt successfully.")
+        with ResultsWriter(file_name) as writer:
+            writer.write(outcomes)
+        print(f"Results saved to {file_name} successfully.")
     except Exception as e:
         print(f"Error saving results to file: {e}")
 
 
+# Histogram counts: vehicles per junction per time bucket, for any junctions and bucket width
+DAY_SECONDS = 24 * 3600
+HISTOGRAM_JUNCTIONS = [ELM_AVENUE, HANLEY_HIGHWAY]  # The junctions charted by default
+HISTOGRAM_COLUMNS = ["JunctionName", "timeOfDay"]  # The columns histogram counts are read from
+HISTOGRAM_COLORS = ['#90EE90', '#FFA07A', '#87CEFA', '#DDA0DD', '#F0E68C', '#FFB6C1', '#B0C4DE', '#D3D3D3']
+
+
+# Function to parse H:MM:SS (minutes and seconds optional) into seconds-of-day, or None
+def seconds_of_day(value):
+    parts = value.split(':')
+    try:
+        hours = int(parts[0])
+        minutes = int(parts[1]) if len(parts) > 1 else 0
+        seconds = int(parts[2]) if len(parts) > 2 else 0
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+
+class TrafficHistogram:
+    """
+    Dense junction x time-bucket vehicle counts.
+
+    counts holds one array row per junction, in the order of junctions, with one slot per
+    bucket of bucket_seconds. With junctions=None every junction seen is added as a new row;
+    otherwise rows for other junctions are ignored. Rows whose time cannot be read are not
+    counted.
+
+    Args:
+        junctions (list): The junctions to count, or None for all of them.
+        bucket_seconds (int): Bucket width; must divide a day evenly. Default is one hour.
+    """
+    def __init__(self, junctions=HISTOGRAM_JUNCTIONS, bucket_seconds=3600):
+        if bucket_seconds <= 0 or DAY_SECONDS % bucket_seconds:
+            raise ValueError(f"Bucket width must divide a day evenly, not {bucket_seconds} seconds.")
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = DAY_SECONDS // bucket_seconds
+        self.fixed = junctions is not None
+        self.junctions = []
+        self.counts = []
+        self.rows_by_junction = {}
+        for junction in junctions or []:
+            self.add_junction(junction)
+
+    def add_junction(self, junction):
+        row = array("q", bytes(8 * self.bucket_count))
+        self.junctions.append(junction)
+        self.counts.append(row)
+        self.rows_by_junction[junction] = row
+        return row
+
+    def row(self, junction):
+        row = self.rows_by_junction.get(junction)
+        if row is None and not self.fixed:
+            row = self.add_junction(junction)
+        return row
+
+    def add_rows(self, rows, junction_at, time_at):
+        """Counts data rows (sequences of strings) given the positions of the two columns."""
+        width = max(junction_at, time_at) + 1
+        bucket_seconds = self.bucket_seconds
+        for row in rows:
+            if len(row) < width:
+                continue  # Blank or short rows have no junction or time to count
+            counts = self.row(row[junction_at])
+            if counts is None:
+                continue
+            seconds = seconds_of_day(row[time_at])
+            if seconds is not None:
+                counts[seconds // bucket_seconds] += 1
+
+    def add_counts(self, deltas):
+        """Adds a {(junction, bucket): vehicles} dict; returns whether anything was counted."""
+        changed = False
+        for (junction, bucket), count in deltas.items():
+            counts = self.row(junction)
+            if counts is not None:
+                counts[bucket] += count
+                changed = True
+        return changed
+
+    def total(self):
+        return sum(sum(row) for row in self.counts)
+
+    def series(self, max_series=len(HISTOGRAM_COLORS)):
+        """
+        Returns up to max_series (name, counts) pairs to draw.
+
+        When there are more junctions than that, the busiest keep their own series and the
+        rest are summed into one "Other junctions" series.
+        """
+        if len(self.junctions) <= max_series:
+            return list(zip(self.junctions, self.counts))
+        by_volume = sorted(zip(self.junctions, self.counts), key=lambda item: sum(item[1]), reverse=True)
+        other = array("q", bytes(8 * self.bucket_count))
+        for _, row in by_volume[max_series - 1:]:
+            for bucket, count in enumerate(row):
+                if count:
+                    other[bucket] += count
+        shown = {name for name, _ in by_volume[:max_series - 1]}
+        kept = [(name, row) for name, row in zip(self.junctions, self.counts) if name in shown]
+        return kept + [(f"Other junctions ({len(by_volume) - len(kept)})", other)]
+
+    def to_dict(self):
+        return {"junctions": self.junctions if self.fixed else None, "names": self.junctions,
+                "bucket_seconds": self.bucket_seconds, "counts": [list(row) for row in self.counts]}
+
+    @classmethod
+    def from_dict(cls, state):
+        histogram = cls(state["junctions"], state["bucket_seconds"])
+        for name, counts in zip(state["names"], state["counts"]):
+            histogram.row(name)[:] = array("q", counts)
+        return histogram
+
+
+# Function to sum counts into at most `columns` columns of equal width
+def downsample(counts, columns):
+    """
+    Sums neighbouring buckets so that there are no more than columns values.
+
+    Each column covers the same number of buckets, the smallest that divides the day evenly.
+    Returns the summed values and how many buckets each one covers, so drawing costs depend
+    on the space available rather than on the bucket width.
+    """
+    factor = max(1, -(-len(counts) // max(columns, 1)))  # Ceiling division
+    while len(counts) % factor:
+        factor += 1
+    if factor == 1:
+        return list(counts), 1
+    return [sum(counts[start:start + factor]) for start in range(0, len(counts), factor)], factor
+
+
+# Function to count the vehicles per time bucket at each histogram junction
+@instrumented("histogram counts")
+def count_traffic(table, junctions=HISTOGRAM_JUNCTIONS, bucket_seconds=3600):
+    record_rows(rows=len(table))
+    histogram = TrafficHistogram(junctions, bucket_seconds)
+    if isinstance(table, TrafficColumns):
+        histogram.add_rows(zip(table.iter_column('JunctionName'), table.iter_column('timeOfDay')), 0, 1)
+    else:
+        histogram.add_rows(table.rows, table.positions['JunctionName'], table.positions['timeOfDay'])
+    return histogram
+
+
+# Query index: one day's rows sorted by junction and time, with a bitmap per category
+BIT_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+popcount = getattr(int, "bit_count", lambda bits: bin(bits).count("1"))  # int.bit_count needs Python 3.10
+
+
+# Function to pack a bytearray of 0/1 flags into an int with bit i set for flag i
+def to_bitmap(flags):
+    return int(flags.translate(BIT_DIGITS)[::-1], 2) if flags else 0
+
+
+# Function to build an int with bits lo up to (not including) hi set
+def bit_range(lo, hi):
+    return ((1 << (hi - lo)) - 1) << lo if hi > lo else 0
+
+
+# Function to read a query time given as seconds of the day or HH:MM[:SS] text
+def time_bound(value, default):
+    if value is None:
+        return default
+    seconds = seconds_of_day(value) if isinstance(value, str) else value
+    if seconds is None:
+        raise ValueError(f"Invalid time '{value}': expected seconds of the day or HH:MM[:SS].")
+    return seconds
+
+
+class TrafficIndex:
+    """
+    Answers questions about one survey from indexes built once, without rescanning rows.
+
+    Rows are sorted by junction and then by second of the day, so the rows of a junction in
+    a time window are one contiguous range, found by binary search. Each row is a bit in that
+    order, and vehicle type, weather, the electric flag, heading and the checks the engines
+    make are bitmaps held as Python ints; a predicate is a few big-integer ANDs and a popcount.
+
+    As in the streaming engine, rows with a missing value are never counted, and rows with an
+    invalid speed or time are counted only in queries without a time window: they sort after
+    the end of the day at their junction.
+
+    Args:
+        table (TrafficTable): The parsed rows of the survey, or a TrafficColumns.
+    """
+    def __init__(self, table):
+        require_columns(table.fieldnames)
+        positions = table.positions
+        vehicle_at = positions["VehicleType"]
+        electric_at = positions["elctricHybrid"]
+        junction_at = positions["JunctionName"]
+        speed_at = positions["VehicleSpeed"]
+        limit_at = positions["JunctionSpeedLimit"]
+        time_at = positions["timeOfDay"]
+        weather_at = positions["Weather_Conditions"]
+        in_at = positions["travel_Direction_in"]
+        out_at = positions["travel_Direction_out"]
+        required_at = [positions[col] for col in REQUIRED_COLUMNS]
+        width = max(required_at) + 1
+        required = itemgetter(*required_at)
+
+        # Sort key of every row: rows that cannot be placed in time go after the day
+        rows = list(table.iter_rows())
+        keys = []
+        speed_checked = bytearray(len(rows))  # By row number: speed and limit are integers
+        counts_by_speed = {}
+        over_checked = bytearray(len(rows))  # By row number: speed above the limit
+        for number, row in enumerate(rows):
+            if len(row) < width or not all(map(str.strip, required(row))):
+                keys.append((row[junction_at] if len(row) > junction_at else "", DAY_SECONDS + 1))
+                continue
+            speed, speed_ok = parse_speed(row[speed_at])
+            limit, limit_ok = parse_speed(row[limit_at])
+            seconds = None
+            if speed_ok and limit_ok:
+                speed_checked[number] = 1
+                over_checked[number] = speed > limit
+                counts_by_speed[speed] = counts_by_speed.get(speed, 0) + 1
+                seconds = seconds_of_day(row[time_at])
+            keys.append((row[junction_at], DAY_SECONDS if seconds is None else seconds))
+        order = sorted(range(len(rows)), key=keys.__getitem__)  # Stable: file order within a second
+
+        size = len(order)
+        self.row_count = size
+        self.order = array("l", order)  # Row number in the file of each bit
+        self.seconds = array("l", [keys[number][1] for number in order])
+        self.junction_ranges = {}  # Junction: (first bit, end of its timed rows, end of its rows)
+        valid, speed_valid, electric, turning, over = (bytearray(size) for _ in range(5))
+        vehicle_types, weathers, headings = {}, {}, {}
+        start = 0
+        for i, number in enumerate(order):
+            junction, seconds = keys[number]
+            if i + 1 == size or keys[order[i + 1]][0] != junction:
+                self.junction_ranges[junction] = (
+                    start, bisect_left(self.seconds, DAY_SECONDS, start, i + 1), i + 1)
+                start = i + 1
+            if seconds > DAY_SECONDS:
+                continue  # Missing values
+            row = rows[number]
+            valid[i] = 1
+            speed_valid[i] = speed_checked[number]
+            electric[i] = row[electric_at].strip().lower() == "true"
+            turning[i] = row[in_at] != row[out_at]
+            over[i] = over_checked[number]
+            for flags, value in ((vehicle_types, row[vehicle_at].strip().lower()),
+                                 (weathers, row[weather_at].strip().lower()),
+                                 (headings, row[out_at].upper())):
+                if value not in flags:
+                    flags[value] = bytearray(size)
+                flags[value][i] = 1
+
+        self.valid = to_bitmap(valid)
+        self.speed_valid = to_bitmap(speed_valid)
+        self.electric = to_bitmap(electric)
+        self.turning = to_bitmap(turning)
+        self.over_limit = to_bitmap(over)
+        self.vehicle_types = {name: to_bitmap(flags) for name, flags in vehicle_types.items()}
+        self.weathers = {name: to_bitmap(flags) for name, flags in weathers.items()}
+        self.headings = {name: to_bitmap(flags) for name, flags in headings.items()}
+        self.speed_counts = bin_speeds(counts_by_speed)  # Every row with a valid speed and limit
+
+    def __len__(self):
+        return self.row_count
+
+    def junction_bits(self, junction):
+        first, _, end = self.junction_ranges.get(junction, (0, 0, 0))
+        return bit_range(first, end)
+
+    def window(self, junction=None, start=0, end=DAY_SECONDS):
+        """Returns the bitmap of the timed rows at junction (or any) with start <= second < end."""
+        bits = 0
+        for name in self.junction_ranges if junction is None else [junction]:
+            first, timed_end, _ = self.junction_ranges.get(name, (0, 0, 0))
+            bits |= bit_range(bisect_left(self.seconds, start, first, timed_end),
+                              bisect_left(self.seconds, end, first, timed_end))
+        return bits
+
+    def select(self, junction=None, start=None, end=None, vehicle_type=None, weather=None,
+               electric=None, heading=None, over_limit=None, turning=None):
+        """
+        Returns the bitmap of the rows that match every predicate given.
+
+        Args:
+            junction (str): Only rows at this junction.
+            start, end: A time window, as seconds of the day or "HH:MM[:SS]" text; start is
+                included and end is not. Either may be left out.
+            vehicle_type, weather: A value or a list of values, compared case-insensitively.
+            electric (bool): Only electric/hybrid vehicles, or only the others.
+            heading (str): The direction the vehicle leaves the junction, such as "N".
+            over_limit (bool): Only vehicles over the junction speed limit, or only the others.
+            turning (bool): Only vehicles leaving in another direction than they came, or not.
+        """
+        if start is None and end is None:
+            bits = self.valid if junction is None else self.valid & self.junction_bits(junction)
+        else:
+            bits = self.window(junction, time_bound(start, 0), time_bound(end, DAY_SECONDS))
+        if vehicle_type is not None:
+            bits &= self.any_of(self.vehicle_types, vehicle_type, str.lower)
+        if weather is not None:
+            bits &= self.any_of(self.weathers, weather, str.lower)
+        if heading is not None:
+            bits &= self.any_of(self.headings, heading, str.upper)
+        for wanted, flags in ((electric, self.electric), (turning, self.turning)):
+            if wanted is not None:
+                bits &= flags if wanted else ~flags
+        if over_limit is not None:
+            bits &= self.over_limit if over_limit else self.speed_valid & ~self.over_limit
+        return bits
+
+    @staticmethod
+    def any_of(bitmaps, values, normalise):
+        if isinstance(values, str):
+            values = [values]
+        bits = 0
+        for value in values:
+            bits |= bitmaps.get(normalise(value.strip()), 0)
+        return bits
+
+    def count(self, **predicates):
+        """Returns the number of rows matching the predicates of select."""
+        return popcount(self.select(**predicates))
+
+    def row_numbers(self, **predicates):
+        """Yields the file row numbers (0 for the first data row) of the matching rows, in time order."""
+        digits = bin(self.select(**predicates))[:1:-1]  # digits[i] is bit i
+        i = digits.find("1")
+        while i >= 0:
+            yield self.order[i]
+            i = digits.find("1", i + 1)
+
+    def bucket_ranges(self, junction, bucket_seconds=3600):
+        """Returns the (first bit, end bit) of each time bucket at the junction."""
+        first, timed_end, _ = self.junction_ranges.get(junction, (0, 0, 0))
+        bounds = [bisect_left(self.seconds, bucket * bucket_seconds, first, timed_end)
+                  for bucket in range(DAY_SECONDS // bucket_seconds)] + [timed_end]
+        return list(zip(bounds, bounds[1:]))
+
+    def count_by_time(self, bucket_seconds=3600, **predicates):
+        """Returns the number of matching rows in each time bucket of the day, within any start/end window."""
+        start = predicates.pop("start", None)
+        end = predicates.pop("end", None)
+        # A window is always given, so only rows with a valid time are counted
+        bits = self.select(start=0 if start is None else start, end=DAY_SECONDS if end is None else end,
+                           **predicates)
+        junction = predicates.get("junction")
+        counts = [0] * (DAY_SECONDS // bucket_seconds)
+        for name in self.junction_ranges if junction is None else [junction]:
+            for bucket, (lo, hi) in enumerate(self.bucket_ranges(name, bucket_seconds)):
+                if hi > lo:
+                    counts[bucket] += popcount((bits >> lo) & ((1 << (hi - lo)) - 1))
+        return counts
+
+    def peak_times(self, bucket_seconds=3600, **predicates):
+        """Returns the highest bucket count and the start second of every bucket that reaches it."""
+        counts = self.count_by_time(bucket_seconds, **predicates)
+        peak = max(counts)
+        return peak, [bucket * bucket_seconds for bucket, count in enumerate(counts) if peak and count == peak]
+
+    def outcomes(self, file_path):
+        """Calculates the outcomes of process_csv_data as queries on the index."""
+        day = {"start": 0}  # Only rows with a valid speed and time, as the hourly statistics use
+        counts = {
+            "total_vehicles": popcount(self.valid),
+            "total_trucks": self.count(vehicle_type="truck"),
+            "total_electric": self.count(electric=True),
+            "two_wheeled": self.count(vehicle_type=TWO_WHEELED_TYPES),
+            "buses_north": self.count(junction=ELM_AVENUE, heading="N", vehicle_type="buss"),
+            "no_turns": self.count(turning=False),
+            "over_speed_limit": self.count(over_limit=True),
+            "elm_avenue_vehicles": self.count(junction=ELM_AVENUE, **day),
+            "hanley_highway_vehicles": self.count(junction=HANLEY_HIGHWAY, **day),
+            "scooters_elm_avenue": self.count(junction=ELM_AVENUE, vehicle_type="scooter", **day),
+            "bicycles": self.count(vehicle_type="bicycle", **day),
+        }
+        # Hanley Highway hours are listed in the order of their first row in the file
+        hanley_hours = [(min(self.order[lo:hi]), hour, hi - lo)
+                        for hour, (lo, hi) in enumerate(self.bucket_ranges(HANLEY_HIGHWAY)) if hi > lo]
+        hanley_traffic_by_hour = {f"{hour:02}": count for _, hour, count in sorted(hanley_hours)}
+        rain_by_hour = self.count_by_time(weather="rain")
+        rain_hour_count = sum(1 for count in rain_by_hour if count)
+        sketch = TrafficSketch.from_tallies(
+            survey_key(file_path), counts, hour_slots(hanley_traffic_by_hour),
+            self.count_by_time(vehicle_type="bicycle"), rain_by_hour, self.speed_counts)
+        return build_outcomes(file_path, counts, hanley_traffic_by_hour, rain_hour_count, sketch)
+
+
+# Background ingestion: counts are read on a worker thread and handed to the window in batches
+LIVE_FRAME_MS = 100  # Shortest time between two redraws of a live histogram
+PUSH_INTERVAL = 0.05  # Seconds between batches of counts sent by the ingestion thread
+FOLLOW_POLL_INTERVAL = 1.0  # Seconds between checks for rows appended to a followed file
+
+
+class TrafficIngestor(threading.Thread):
+    """
+    Reads a data file on a worker thread and sends junction time-bucket counts to a queue.
+
+    Each item put on updates is a dict of {(junction, bucket): vehicles} added since the
+    previous item, counted as TrafficHistogram counts them. With follow, the thread keeps
+    polling the CSV for appended lines until stop is called.
+
+    Args:
+        junctions (list): Only count these junctions, or None to count every junction.
+        bucket_seconds (int): The width of a time bucket.
+    """
+    def __init__(self, file_path, updates, follow=False, poll_interval=FOLLOW_POLL_INTERVAL,
+                 junctions=HISTOGRAM_JUNCTIONS, bucket_seconds=3600):
+        super().__init__(daemon=True)
+        self.file_path = file_path
+        self.updates = updates
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.junctions = None if junctions is None else set(junctions)
+        self.bucket_seconds = bucket_seconds
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        try:
+            if self.file_path.endswith(COLUMNAR_SUFFIX):
+                columns = TrafficColumns(self.file_path)
+                self.count_rows(zip(columns.iter_column('JunctionName'), columns.iter_column('timeOfDay')), 0, 1)
+            else:
+                self.follow_csv()
+        except FileNotFoundError:
+            print(f"Error: File '{self.file_path}' not found.")
+        except (KeyError, ValueError) as e:
+            print(f"Error loading histogram data: {e}")
+
+    def follow_csv(self):
+        with open(self.file_path, mode="rb") as file:
+            header = file.readline()
+            fieldnames = next(csv.reader([header.decode()]), [])
+            require_columns(fieldnames, HISTOGRAM_COLUMNS)
+            junction_at = fieldnames.index('JunctionName')
+            time_at = fieldnames.index('timeOfDay')
+            offset = len(header)
+            while not self.stop_event.is_set():
+                file_size = os.fstat(file.fileno()).st_size
+                # A followed file may end in a line still being written; a one-shot read counts it all
+                end = last_line_end(file, offset, file_size) if self.follow else file_size
+                if end > offset:
+                    file.seek(offset)
+                    self.count_rows(csv.reader(read_lines_in_chunks(file, size=end - offset)),
+                                    junction_at, time_at)
+                    offset = end
+                if not self.follow:
+                    break
+                self.stop_event.wait(self.poll_interval)
+
+    def count_rows(self, rows, junction_at, time_at):
+        width = max(junction_at, time_at) + 1
+        junctions = self.junctions
+        bucket_seconds = self.bucket_seconds
+        deltas = {}
+        last_push = time.monotonic()
+        for count, row in enumerate(rows, 1):
+            if len(row) >= width:
+                junction = row[junction_at]
+                if junctions is None or junction in junctions:
+                    seconds = seconds_of_day(row[time_at])
+                    if seconds is not None:
+                        key = (junction, seconds // bucket_seconds)
+                        deltas[key] = deltas.get(key, 0) + 1
+            if not count & 0xFFF:  # Check the clock every 4096 rows
+                if self.stop_event.is_set():
+                    return
+                if time.monotonic() - last_push >= PUSH_INTERVAL:
+                    self.updates.put(deltas)
+                    deltas = {}
+                    last_push = time.monotonic()
+        if deltas:
+            self.updates.put(deltas)
+
+
+# Chart layout shared by the histogram window and the image renderers
+CHART_MARGIN_X = 50
+CHART_MARGIN_Y = 170
+LEGEND_TOP = 50  # The legend is one entry per series, stacked down the top-left corner
+LEGEND_STEP = 25
+
+
+# Function to work out which series and how many columns fit a chart of the given width
+def plan_chart(traffic_data, canvas_width):
+    """
+    Works out which series and how many columns fit the canvas.
+
+    Bars keep their full 16 px size while the chart fits; on a narrower canvas they shrink,
+    and once they would be thinner than MIN_BAR_WIDTH neighbouring buckets are summed into
+    one column. The number of canvas items is therefore bounded by the canvas width. The
+    tallest bar reaches plot_top, which is lowered below the legend when it has many entries.
+    """
+    bar_width = 16
+    bar_spacing = 3.5
+    min_bar_width = 2
+    series = traffic_data.series() or [("", array("q"))]  # No junction seen yet
+    group_pitch = len(series) * (bar_width + bar_spacing) + 0.4 * bar_width + 6 - bar_spacing
+    plot_width = max(canvas_width - 2 * CHART_MARGIN_X, 1)
+    max_columns = max(1, int(plot_width / (group_pitch * min_bar_width / bar_width)))
+    values, factor = zip(*(downsample(counts, max_columns) for _, counts in series))
+    columns = max(len(values[0]), 1)
+    scale = min(1, plot_width / (columns * group_pitch))
+    return {
+        "names": [name for name, _ in series],
+        "plot_top": max(CHART_MARGIN_Y, LEGEND_TOP + LEGEND_STEP * len(series) + 15),
+        "values": values,
+        "columns": len(values[0]),
+        "column_seconds": traffic_data.bucket_seconds * factor[0],
+        "bar_width": bar_width * scale,
+        "bar_spacing": bar_spacing * scale,
+        "group_pitch": group_pitch * scale,
+    }
+
+
+# Function to title a chart after its column width and survey date
+def chart_title(chart, selected_date):
+    column_seconds = chart["column_seconds"]
+    period = "Hour" if column_seconds == 3600 else f"{column_seconds // 60} Minutes"
+    return f"Histogram of Vehicle Frequency per {period} ({selected_date})"
+
+
+# Function to return the time label under column i, or None for columns left unlabelled
+def column_label(chart, i):
+    label_step = int(-(-36 // chart["group_pitch"]))  # Keep time labels 36 px apart
+    if i % label_step:
+        return None
+    column_seconds = chart["column_seconds"]
+    seconds = i * column_seconds
+    return f"{seconds // 3600:02}" if column_seconds % 3600 == 0 else format_seconds(seconds)[:5]
+
+
 # Task D: Create histogram using Tkinter
 class HistogramApp:
-    def __init__(self, master, data_file, selected_date):
+    def __init__(self, master, data_file, selected_date, table=None, traffic_data=None, follow=False,
+                 junctions=HISTOGRAM_JUNCTIONS, bucket_seconds=3600):
         self.master = master
         self.master.title("Histogram")
         self.data_file = data_file
         self.selected_date = selected_date
+        self.table = table  # Already-parsed rows shared with process_csv_data
         self.canvas = None
         self.frame = None
-        
-        # Traffic data storage
-        self.traffic_data = {
-            "Elm Avenue/Rabbit Road": {str(i).zfill(2): 0 for i in range(24)},
-            "Hanley Highway/Westway": {str(i).zfill(2): 0 for i in range(24)}
-        }
-        
+        self.updates = None
+        self.ingestor = None
+        self.bar_items = {}  # Canvas items, created on the first draw
+        self.drawn_chart = None
+
+        # Traffic data storage: a TrafficHistogram of the junctions and bucket width to chart
+        self.traffic_data = TrafficHistogram(junctions, bucket_seconds)
+
         try:
-            self.load_traffic_data()
+            if traffic_data is not None:
+                self.traffic_data = traffic_data  # Counts already known, e.g. from the results cache
+            elif self.table is not None:
+                self.load_traffic_data()
             self.setup_window()
+            if traffic_data is None and self.table is None:
+                self.start_ingestion(follow)  # Read the file without blocking the window
             self.draw_histogram()
             self.add_legend()
         except Exception as e:
@@ -259,107 +2580,172 @@ class HistogramApp:
         self.frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         self.canvas = tk.Canvas(self.frame, width=900, height=500, bg="white")
         self.canvas.pack(fill=tk.BOTH, expand=True)
-        
+
         # Update canvas dimensions
         self.master.update()
+        self.canvas_width = self.canvas.winfo_width()
+        self.canvas_height = self.canvas.winfo_height()
+        self.canvas.bind("<Configure>", self.on_resize)
+
+    def on_resize(self, event):
+        # The cached size is only re-read here, never while drawing
+        if (event.width, event.height) != (self.canvas_width, self.canvas_height):
+            self.canvas_width = event.width
+            self.canvas_height = event.height
+            self.draw_histogram()
+
+    def create_histogram_items(self, chart):
+        """
+        Creates every canvas item of the chart once; draw_histogram only moves and relabels them.
 
+        Items are placed at the origin here and tagged "chart" so they can be hidden together
+        while there is no data. They are only created again when the series or the number of
+        columns change.
+        """
+        self.canvas.delete("chart")
+        title = chart_title(chart, self.selected_date)
+        self.title_item = self.canvas.create_text(0, 0, text=title, font=('Arial', 12, 'bold'), tags="chart")
+        self.axis_item = self.canvas.create_text(0, 0, text="Hours 00:00 to 24:00", font=('Arial', 10), tags="chart")
+        self.message_item = self.canvas.create_text(0, 0, text="No traffic data available to display.",
+                                                    font=('Arial', 14, 'bold'), fill="red", state=tk.HIDDEN,
+                                                    tags="chart")
+        self.bar_items = {}  # (series, column) -> (bar, value label)
+        self.hour_items = {}  # column -> time label, for the columns that get one
+        for i in range(chart["columns"]):
+            for j in range(len(chart["names"])):
+                bar = self.canvas.create_rectangle(0, 0, 0, 0, fill=HISTOGRAM_COLORS[j], outline='black',
+                                                   tags="chart")
+                label = self.canvas.create_text(0, 0, text="", font=('Arial', 8), tags="chart")
+                self.bar_items[(j, i)] = (bar, label)
+            text = column_label(chart, i)
+            if text is not None:
+                self.hour_items[i] = self.canvas.create_text(0, 0, text=text, font=('Arial', 8), tags="chart")
+        self.drawn_values = {}
+        self.drawn_layout = None
+        self.drawn_chart = (chart["names"], chart["columns"], chart["column_seconds"])
+        self.add_legend()
+
+    @instrumented("draw")
     def draw_histogram(self):
         try:
-            margin_x = 50
-            margin_y = 170
-            bar_spacing = 3.5
-            bar_width = 16
-            colors = ['#90EE90', '#FFA07A']
+            margin_x = CHART_MARGIN_X
+            margin_y = CHART_MARGIN_Y
+
+            chart = plan_chart(self.traffic_data, self.canvas_width)
+            if (chart["names"], chart["columns"], chart["column_seconds"]) != self.drawn_chart:
+                self.create_histogram_items(chart)
+            width, height = self.canvas_width, self.canvas_height
+            bar_width = chart["bar_width"]
+            bar_spacing = chart["bar_spacing"]
+            group_pitch = chart["group_pitch"]
+            show_values = bar_width >= 12  # Value labels only fit above wide bars
 
             # Calculate max value for scaling
-            max_traffic = max(max(junction_data.values()) for junction_data in self.traffic_data.values())
+            max_traffic = max(max(values, default=0) for values in chart["values"])
+            layout = (width, height, max_traffic)
+            relayout = layout != self.drawn_layout  # Resized or rescaled: every item moves
+            self.drawn_layout = layout
             if max_traffic == 0:
-                self.canvas.create_text(
-                    self.canvas.winfo_width() / 2,
-                    self.canvas.winfo_height() / 2,
-                    text="No traffic data available to display.",
-                    font=('Arial', 14, 'bold'),
-                    fill="red"
-                )
-                return  # Exit early
-
-            graph_height = self.canvas.winfo_height() - 2 * margin_y
-
-            # Add title and labels
-            title = f"Histogram of Vehicle Frequency per Hour ({self.selected_date})"
-            self.canvas.create_text(self.canvas.winfo_width() / 5.9, margin_y / 8, 
-                                    text=title, font=('Arial', 12, 'bold'))
-            self.canvas.create_text(self.canvas.winfo_width() / 2, 
-                                    self.canvas.winfo_height() - 100, 
-                                    text="Hours 00:00 to 24:00", font=('Arial', 10))
-
-            # Draw bars
-            junctions = list(self.traffic_data.keys())
-            hours = [str(i).zfill(2) for i in range(24)]
-
-            for i, hour in enumerate(hours):
-                x_base = margin_x + (i * (2.4 * bar_width + bar_spacing + 6))
-                
-                for j, junction in enumerate(junctions):
-                    traffic = self.traffic_data[junction][hour]
-                    bar_height = (traffic / max_traffic) * graph_height if max_traffic > 0 else 0
-                    x = x_base + (j * (bar_width + bar_spacing))
-                    y = self.canvas.winfo_height() - margin_y - bar_height
-
-                    # Draw bar
-                    self.canvas.create_rectangle(x, y, x + bar_width, 
-                                                self.canvas.winfo_height() - margin_y, 
-                                                fill=colors[j], outline='black')
-                    
-                    # Add traffic value above bars
-                    if traffic > 0:
-                        self.canvas.create_text(x + bar_width / 2, y - 5, 
-                                                text=str(traffic), font=('Arial', 8))
-
-                # Add hour labels
-                self.canvas.create_text(x_base + bar_width + bar_spacing, 
-                                        self.canvas.winfo_height() - margin_y + 15, 
-                                        text=hour, font=('Arial', 8))
+                if relayout:
+                    self.canvas.itemconfigure("chart", state=tk.HIDDEN)
+                    self.canvas.coords(self.message_item, width / 2, height / 2)
+                    self.canvas.itemconfigure(self.message_item, state=tk.NORMAL)
+                return  # Nothing to scale the bars by
+
+            graph_height = height - chart["plot_top"] - margin_y
+            base_y = height - margin_y
+            if relayout:
+                self.canvas.itemconfigure("chart", state=tk.NORMAL)
+                self.canvas.itemconfigure(self.message_item, state=tk.HIDDEN)
+                self.canvas.coords(self.title_item, width / 5.9, margin_y / 8)
+                self.canvas.coords(self.axis_item, width / 2, height - 100)
+                group_middle = len(chart["names"]) * (bar_width + bar_spacing) / 2
+                for i, hour_item in self.hour_items.items():
+                    self.canvas.coords(hour_item, margin_x + i * group_pitch + group_middle, base_y + 15)
+                self.drawn_values.clear()
+
+            # Only bars whose value changed since the last draw are touched
+            for key, (bar, label) in self.bar_items.items():
+                j, i = key
+                traffic = chart["values"][j][i]
+                if self.drawn_values.get(key) == traffic:
+                    continue
+                self.drawn_values[key] = traffic
+                bar_height = (traffic / max_traffic) * graph_height
+                x = margin_x + i * group_pitch + j * (bar_width + bar_spacing)
+                y = base_y - bar_height
+                self.canvas.coords(bar, x, y, x + bar_width, base_y)
+                self.canvas.coords(label, x + bar_width / 2, y - 5)
+                self.canvas.itemconfigure(label, text=str(traffic),
+                                          state=tk.NORMAL if show_values and traffic > 0 else tk.HIDDEN)
         except Exception as e:
             print(f"Error during histogram drawing: {e}")
 
     def add_legend(self):
         try:
-            colors = ['#90EE90', '#FFA07A']
-            legend_y = 50
-            for j, junction in enumerate(self.traffic_data.keys()):
-                self.canvas.create_rectangle(50, legend_y, 70, legend_y + 15, 
-                                            fill=colors[j], outline='black')
-                self.canvas.create_text(75, legend_y + 7, text=junction, 
-                                        anchor=tk.W, font=('Arial', 10))
-                legend_y += 25
+            self.canvas.delete("legend")  # Redrawn when the charted series change
+            names = self.drawn_chart[0] if self.drawn_chart else self.traffic_data.junctions
+            legend_y = LEGEND_TOP
+            for j, junction in enumerate(names):
+                self.canvas.create_rectangle(50, legend_y, 70, legend_y + 15,
+                                            fill=HISTOGRAM_COLORS[j], outline='black', tags="legend")
+                self.canvas.create_text(75, legend_y + 7, text=junction,
+                                        anchor=tk.W, font=('Arial', 10), tags="legend")
+                legend_y += LEGEND_STEP
         except Exception as e:
             print(f"Error adding legend: {e}")
 
+    def start_ingestion(self, follow=False):
+        self.updates = queue.Queue()
+        self.ingestor = TrafficIngestor(self.data_file, self.updates, follow,
+                                        junctions=self.traffic_data.junctions if self.traffic_data.fixed else None,
+                                        bucket_seconds=self.traffic_data.bucket_seconds)
+        self.canvas.bind("<Destroy>", lambda event: self.ingestor.stop())
+        self.ingestor.start()
+        self.master.after(LIVE_FRAME_MS, self.apply_updates)
+
+    def apply_updates(self):
+        changed = False
+        while True:
+            try:
+                deltas = self.updates.get_nowait()
+            except queue.Empty:
+                break
+            changed = self.traffic_data.add_counts(deltas) or changed
+        if changed:
+            self.draw_histogram()
+        # Keep ticking while rows can still arrive
+        if self.ingestor.is_alive() or not self.updates.empty():
+            self.master.after(LIVE_FRAME_MS, self.apply_updates)
+
     def load_traffic_data(self):
         try:
-            with open(self.data_file, 'r') as file:
-                csv_reader = csv.DictReader(file)
-                for row in csv_reader:
-                    hour = row['timeOfDay'].split(':')[0].zfill(2)
-                    junction = row['JunctionName']
-                    if junction in self.traffic_data:
-                        self.traffic_data[junction][hour] += 1
+            if self.table is None:
+                self.table = load_traffic_table(self.data_file)
+            self.traffic_data = count_traffic(self.table, self.traffic_data.junctions if self.traffic_data.fixed else None,
+                                              self.traffic_data.bucket_seconds)
         except FileNotFoundError:
             print(f"Error: File '{self.data_file}' not found.")
 
 
 # Modify the create_histogram function to not block execution
-def create_histogram(file_path, selected_date):
+def create_histogram(file_path, selected_date, table=None, traffic_data=None, follow=False,
+                     junctions=HISTOGRAM_JUNCTIONS, bucket_seconds=3600):
+    if tk is None:
+        print("Tkinter is not installed - use --render to save the histogram as an image instead.")
+        return None
     try:
         root = tk.Tk()
-        root.state('zoomed')
+        try:
+            root.state('zoomed')
+        except tk.TclError:
+            pass  # 'zoomed' is only available on Windows and macOS
         root.geometry("800x600")
-        app = HistogramApp(root, file_path, selected_date)
-        
+        app = HistogramApp(root, file_path, selected_date, table, traffic_data, follow, junctions, bucket_seconds)
+
         # Don't wait for window closure
         root.update()
-        
+
         # Continue with program flow
         return root
     except Exception as e:
@@ -367,10 +2753,334 @@ def create_histogram(file_path, selected_date):
         return None
 
 
+# Headless charts: the histogram drawn straight to PNG or SVG files, without a window
+CHART_SIZE = (1300, 800)  # Default image width and height in pixels
+CHART_FORMATS = ("png", "svg")
+CHART_FONT_FILES = {False: ("arial.ttf", "DejaVuSans.ttf"), True: ("arialbd.ttf", "DejaVuSans-Bold.ttf")}
+CHART_FONTS = {}  # (pixel size, bold) -> loaded font, per process
+
+
+# Function to lay out a chart as the shapes HistogramApp would put on its canvas
+def chart_shapes(traffic_data, selected_date, width, height):
+    """
+    Returns the shapes of the histogram of traffic_data on a width x height canvas.
+
+    Shapes are ("rect", x0, y0, x1, y1, fill), drawn with a black outline, and
+    ("text", x, y, text, font, fill, anchor), where font is a Tk font tuple and anchor is
+    "center" or "w". The positions are those used by draw_histogram and add_legend.
+    """
+    chart = plan_chart(traffic_data, width)
+    margin_x = CHART_MARGIN_X
+    margin_y = CHART_MARGIN_Y
+    bar_width = chart["bar_width"]
+    bar_spacing = chart["bar_spacing"]
+    group_pitch = chart["group_pitch"]
+    shapes = []
+
+    max_traffic = max(max(values, default=0) for values in chart["values"])
+    if max_traffic == 0:
+        shapes.append(("text", width / 2, height / 2, "No traffic data available to display.",
+                       ('Arial', 14, 'bold'), "red", "center"))
+    else:
+        graph_height = height - chart["plot_top"] - margin_y
+        base_y = height - margin_y
+        show_values = bar_width >= 12  # Value labels only fit above wide bars
+        shapes.append(("text", width / 5.9, margin_y / 8, chart_title(chart, selected_date),
+                       ('Arial', 12, 'bold'), "black", "center"))
+        shapes.append(("text", width / 2, height - 100, "Hours 00:00 to 24:00", ('Arial', 10), "black", "center"))
+        group_middle = len(chart["names"]) * (bar_width + bar_spacing) / 2
+        for i in range(chart["columns"]):
+            for j, values in enumerate(chart["values"]):
+                traffic = values[i]
+                x = margin_x + i * group_pitch + j * (bar_width + bar_spacing)
+                y = base_y - (traffic / max_traffic) * graph_height
+                shapes.append(("rect", x, y, x + bar_width, base_y, HISTOGRAM_COLORS[j]))
+                if show_values and traffic > 0:
+                    shapes.append(("text", x + bar_width / 2, y - 5, str(traffic), ('Arial', 8), "black", "center"))
+            text = column_label(chart, i)
+            if text is not None:
+                shapes.append(("text", margin_x + i * group_pitch + group_middle, base_y + 15, text,
+                               ('Arial', 8), "black", "center"))
+
+    legend_y = LEGEND_TOP
+    for j, junction in enumerate(chart["names"]):
+        shapes.append(("rect", 50, legend_y, 70, legend_y + 15, HISTOGRAM_COLORS[j]))
+        shapes.append(("text", 75, legend_y + 7, junction, ('Arial', 10), "black", "w"))
+        legend_y += LEGEND_STEP
+    return shapes
+
+
+# Function to write chart shapes as an SVG document
+def render_svg(shapes, width, height):
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'viewBox="0 0 {width} {height}">',
+             f'<rect width="{width}" height="{height}" fill="white"/>']
+    for shape in shapes:
+        if shape[0] == "rect":
+            _, x0, y0, x1, y1, fill = shape
+            parts.append(f'<rect x="{x0:.1f}" y="{y0:.1f}" width="{x1 - x0:.1f}" height="{y1 - y0:.1f}" '
+                         f'fill="{fill}" stroke="black"/>')
+        else:
+            _, x, y, text, font, fill, anchor = shape
+            weight = ' font-weight="bold"' if "bold" in font[2:] else ""
+            align = "middle" if anchor == "center" else "start"
+            parts.append(f'<text x="{x:.1f}" y="{y:.1f}" font-family="{font[0]}" font-size="{font[1]}pt"{weight} '
+                         f'fill="{fill}" text-anchor="{align}" dominant-baseline="central">'
+                         f'{html.escape(text)}</text>')
+    parts.append("</svg>\n")
+    return "\n".join(parts)
+
+
+# Function to load the font for a Tk font tuple, once per process
+def chart_font(font):
+    size = round(font[1] * 4 / 3)  # Tk sizes are points; charts are drawn at 96 dpi
+    bold = "bold" in font[2:]
+    key = (size, bold)
+    if key not in CHART_FONTS:
+        CHART_FONTS[key] = None
+        for file_name in CHART_FONT_FILES[bold]:
+            try:
+                CHART_FONTS[key] = ImageFont.truetype(file_name, size)
+                break
+            except OSError:
+                continue  # Not installed here; try the next font
+        if CHART_FONTS[key] is None:
+            CHART_FONTS[key] = ImageFont.load_default()
+    return CHART_FONTS[key]
+
+
+# Function to draw chart shapes onto a Pillow image
+def render_image(shapes, width, height):
+    # A chart has a dozen colours: a paletted image compresses several times faster than RGB
+    image = Image.new("P", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    for shape in shapes:
+        if shape[0] == "rect":
+            _, x0, y0, x1, y1, fill = shape
+            draw.rectangle((round(x0), round(y0), round(x1), round(y1)), fill=fill, outline="black")
+        else:
+            _, x, y, text, font, fill, anchor = shape
+            font = chart_font(font)
+            left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+            x -= (left + right) / 2 if anchor == "center" else left
+            x = max(x, 0)  # Fallback fonts run wider than Arial; keep the title inside the image
+            draw.text((round(x), round(y - (top + bottom) / 2)), text, fill=fill, font=font)
+    return image
+
+
+# Function to save the histogram of traffic_data as a .png or .svg file
+def save_chart(traffic_data, selected_date, file_name, width=CHART_SIZE[0], height=CHART_SIZE[1]):
+    """
+    Draws the same chart as the histogram window, without a GUI toolkit.
+
+    The format is taken from the file name's suffix. PNG output needs Pillow; SVG output
+    only needs the standard library. The file is written under a temporary name first so
+    that a chart is never left half-written.
+
+    Args:
+        traffic_data (TrafficHistogram): The counts to chart.
+        selected_date (str): The survey date shown in the title.
+        file_name (str): The .png or .svg file to write.
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+    """
+    shapes = chart_shapes(traffic_data, selected_date, width, height)
+    if file_name.lower().endswith(".svg"):
+        with atomic_write(file_name, encoding="utf-8") as file:
+            file.write(render_svg(shapes, width, height))
+    else:
+        with atomic_write(file_name, "wb") as file:
+            render_image(shapes, width, height).save(file, format="PNG")
+    return file_name
+
+
+# Worker task: count the traffic in one survey file and save its chart
+def render_chart_file(file_path, chart_file, junctions, bucket_seconds, size):
+    try:
+        table = load_traffic_table(file_path)
+        require_columns(table.fieldnames, HISTOGRAM_COLUMNS)
+        traffic_data = count_traffic(table, junctions, bucket_seconds)
+    except FileNotFoundError:
+        return f"Error: File not found - '{file_path}'"
+    except (KeyError, ValueError) as e:
+        return f"Error in '{file_path}': {e}"  # One bad day must not stop the other charts
+    survey_date = date_from_file_name(file_path)
+    save_chart(traffic_data, survey_date.strftime("%d/%m/%Y") if survey_date else file_path, chart_file, *size)
+    return None
+
+
+# Function to save a chart for every survey file, spread over a process pool
+@instrumented("draw")
+def render_charts(file_paths, chart_dir, image_format="png", workers=None,
+                  junctions=HISTOGRAM_JUNCTIONS, bucket_seconds=3600, size=CHART_SIZE):
+    """
+    Saves the histogram of each file to chart_dir as <date>.<image_format>.
+
+    Each file is counted and drawn by its own worker task, so only the chart files leave
+    the workers.
+
+    Args:
+        file_paths (list): The traffic data files to chart.
+        chart_dir (str): The folder for the images; created if needed.
+        image_format (str): "png" or "svg". PNG falls back to SVG when Pillow is missing.
+        workers (int): Worker processes, defaulting to the number of CPUs. With 1 the
+            charts are drawn in this process.
+        junctions (list): The junctions to chart, or None for all of them.
+        bucket_seconds (int): Width of a time bucket.
+        size (tuple): Image width and height in pixels.
+
+    Returns:
+        list: The chart files written.
+    """
+    if image_format == "png" and Image is None:
+        print("Pillow is not installed - saving SVG charts instead.")
+        image_format = "svg"
+    os.makedirs(chart_dir, exist_ok=True)
+    tasks = [(file_path, os.path.join(chart_dir, f"{survey_key(file_path)}.{image_format}"),
+              junctions, bucket_seconds, size) for file_path in file_paths]
+    if workers == 1:
+        errors = [render_chart_file(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            errors = list(executor.map(render_chart_file, *zip(*tasks))) if tasks else []
+
+    charts = []
+    for (_, chart_file, *_), error in zip(tasks, errors):
+        if error:
+            print(error)
+        else:
+            charts.append(chart_file)
+    return charts
+
+
+# Persistent results cache: outcomes and histogram counts survive between runs
+CACHE_DIR = ".traffic_cache"
+CACHE_VERSION = 3  # Bumped whenever the stored entry format changes
+
+
+class ResultsCache:
+    """
+    Stores the outcomes and histogram counts of each analysed file on disk.
+
+    An entry is reused while the file's size and modification time are unchanged. If only
+    the modification time differs, the file's SHA-256 decides, so a touched but identical
+    file stays cached while a rewritten one is analysed again. The least recently used
+    entries are evicted once the cache holds more than max_entries or max_bytes.
+    """
+    def __init__(self, directory=CACHE_DIR, max_entries=256, max_bytes=16 << 20):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def entry_path(self, file_path, engine):
+        key = f"{CACHE_VERSION}|{os.path.abspath(file_path)}|{engine}".encode()
+        return os.path.join(self.directory, hashlib.sha1(key).hexdigest() + ".json")
+
+    @staticmethod
+    def content_hash(file_path):
+        digest = hashlib.sha256()
+        with open(file_path, mode="rb") as file:
+            for chunk in iter(lambda: file.read(STREAM_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, file_path, engine="python"):
+        """Returns (outcomes, traffic_data) for an unchanged file, or None."""
+        entry_path = self.entry_path(file_path, engine)
+        try:
+            stat = os.stat(file_path)
+            with open(entry_path, "r") as file:
+                entry = json.load(file)
+            if entry["size"] != stat.st_size:
+                return None
+            if entry["mtime_ns"] != stat.st_mtime_ns:
+                if entry["sha256"] != self.content_hash(file_path):
+                    return None
+                entry["mtime_ns"] = stat.st_mtime_ns  # Same content, newer timestamp
+                self.write_entry(entry_path, entry)
+            else:
+                os.utime(entry_path)  # Mark as recently used
+        except (OSError, ValueError, KeyError):
+            return None  # Missing or unreadable entries are plain misses
+        return entry["outcomes"], entry["traffic_data"]
+
+    def put(self, file_path, outcomes, traffic_data, engine="python"):
+        try:
+            stat = os.stat(file_path)
+            entry = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": self.content_hash(file_path),
+                "outcomes": outcomes,
+                "traffic_data": traffic_data,
+            }
+            os.makedirs(self.directory, exist_ok=True)
+            self.write_entry(self.entry_path(file_path, engine), entry)
+            self.evict()
+        except OSError as e:
+            print(f"Error caching results: {e}")
+
+    @staticmethod
+    def write_entry(entry_path, entry):
+        with atomic_write(entry_path) as file:  # Readers never see a half-written entry
+            json.dump(entry, file)
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        entries.sort(reverse=True)  # Most recently used first
+        total_bytes = 0
+        for count, (_, size, entry_path) in enumerate(entries, 1):
+            total_bytes += size
+            if count > self.max_entries or total_bytes > self.max_bytes:
+                os.remove(entry_path)
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".json"):
+                    os.remove(entry.path)
+
+
+# Function to read a terminal answer while the histogram window keeps running
+def input_with_window(prompt, window):
+    """
+    Runs the window's event loop until the user answers prompt.
+
+    input() blocks, so it is read on a worker thread while the main thread services Tk. If
+    the window is closed first, the answer is simply awaited.
+    """
+    answers = queue.Queue()
+    threading.Thread(target=lambda: answers.put(input(prompt)), daemon=True).start()
+    if window is None:
+        return answers.get()
+
+    def check_answer():
+        if answers.empty():
+            window.after(50, check_answer)
+        else:
+            window.quit()
+
+    try:
+        window.after(50, check_answer)
+        window.mainloop()
+    except tk.TclError:
+        pass  # Window already closed
+    return answers.get()
+
+
 #Task E
 class MultiCSVProcessor:
-    def __init__(self):
+    def __init__(self, engine="python", cache_dir=CACHE_DIR, quarantine=None):
+        self.engine = engine  # "python", "numpy", "stream" or "index", see process_csv_data
+        self.cache = ResultsCache(cache_dir) if cache_dir else None  # None disables caching
+        self.quarantine = quarantine  # File for the rows each analysis skips, or None
         self.current_data = None
+        self.current_table = None
+        self.current_traffic_data = None
         self.date_to_file = {
             "15/06/2024": "traffic_data15062024.csv",
             "16/06/2024": "traffic_data16062024.csv",
@@ -381,14 +3091,38 @@ class MultiCSVProcessor:
         if date in self.date_to_file:
             file_name = self.date_to_file[date]
             print(f"Processing dataset for {date}...")
-            self.current_data = process_csv_data(file_name)
+            # A quarantine file is only written by a real analysis, so cached outcomes are not used
+            cached = self.cache.get(file_name, self.engine) if self.cache and not self.quarantine else None
+            if cached:
+                self.current_data, traffic_data = cached
+                self.current_traffic_data = TrafficHistogram.from_dict(traffic_data)
+                return True
+            if self.engine == "stream":
+                # One bounded pass over the file gives both the outcomes and the histogram counts
+                histogram = TrafficHistogram()
+                self.current_data = process_csv_data(file_name, None, self.engine, self.quarantine, histogram)
+            else:
+                try:
+                    self.current_table = load_traffic_table(file_name)
+                except FileNotFoundError:
+                    print(f"Error: File not found - '{file_name}'")
+                    return False
+                self.current_data = process_csv_data(file_name, self.current_table, self.engine, self.quarantine)
             if self.current_data:
                 self.current_data["File Name"] = file_name  # Ensure correct filename is stored
+                if self.current_table is None:
+                    self.current_traffic_data = histogram
+                else:
+                    self.current_traffic_data = count_traffic(self.current_table)
+                if self.cache:
+                    self.cache.put(file_name, self.current_data, self.current_traffic_data.to_dict(), self.engine)
                 return True
         return False
 
     def clear_previous_data(self):
         self.current_data = None
+        self.current_table = None
+        self.current_traffic_data = None
 
     def process_files(self):
         self.handle_user_interaction()
@@ -401,13 +3135,18 @@ class MultiCSVProcessor:
                 display_outcomes(self.current_data)
                 save_results_to_file(self.current_data)
                 
-                histogram_window = create_histogram(self.date_to_file[date], date)
+                histogram_window = create_histogram(self.date_to_file[date], date, self.current_table,
+                                                    self.current_traffic_data)
                 
                 while True:
-                    choice = input("Do you want to select another data file for a different date? Y/N > ").strip().upper()
+                    choice = input_with_window("Do you want to select another data file for a different date? Y/N > ",
+                                               histogram_window).strip().upper()
                     if choice in ["Y", "N"]:
                         if histogram_window:
-                            histogram_window.destroy()
+                            try:
+                                histogram_window.destroy()
+                            except tk.TclError:
+                                pass  # Closed by the user
                         if choice == "N":
                             print("End of run")
                             return
@@ -421,9 +3160,123 @@ class MultiCSVProcessor:
                 continue
 
 # Main Program Execution
-if __name__ == "__main__":
-    processor = MultiCSVProcessor()
-    processor.process_files()  # Using process_files as main entry point
+def parse_survey_date(text):
+    return datetime.strptime(text, "%d/%m/%Y").date()
+
 
+def parse_chart_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
 
 
+# Function to run the mode selected on the command line
+def run_command(args):
+    if args.histogram:
+        survey_date = date_from_file_name(args.histogram)
+        window = create_histogram(args.histogram, survey_date.strftime("%d/%m/%Y") if survey_date else args.histogram,
+                                  follow=args.follow, junctions=None if args.junctions == ["all"] else args.junctions,
+                                  bucket_seconds=args.bucket_minutes * 60)
+        if window:
+            window.mainloop()
+    elif args.update:
+        analysis = IncrementalAnalysis(args.update, args.state or args.update + ".state.json")
+        try:
+            display_outcomes(analysis.refresh(args.final))
+        except FileNotFoundError:
+            print(f"Error: File not found - '{args.update}'")
+        except KeyError as e:
+            print(f"Error: {e}")
+    elif args.convert:
+        for csv_path in args.convert:
+            print(f"Converted {csv_path} to {convert_to_columnar(csv_path)}")
+    elif args.batch:
+        run_batch(args.batch, args.start_date, args.end_date, args.workers,
+                  args.shard_mb << 20, args.report, args.sketch_dir, args.results,
+                  args.rotate_mb << 20 if args.rotate_mb else None)
+    elif args.rollup:
+        display_rollup(rollup_sketches(args.rollup, args.start_date, args.end_date))
+    elif args.render:
+        file_paths = find_traffic_files(args.render, args.start_date, args.end_date)
+        if not file_paths:
+            print("No traffic data files found for the selected dates.")
+            return
+        charts = render_charts(file_paths, args.chart_dir, args.chart_format, args.workers,
+                               None if args.junctions == ["all"] else args.junctions,
+                               args.bucket_minutes * 60, args.chart_size)
+        print(f"Saved {len(charts)} charts to {args.chart_dir}.")
+    else:
+        processor = MultiCSVProcessor(engine=args.engine, quarantine=args.quarantine)
+        processor.process_files()  # Using process_files as main entry point
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse traffic survey data files.")
+    parser.add_argument("--batch", metavar="DIR",
+                        help="Analyse every traffic_data*.csv in DIR without prompting.")
+    parser.add_argument("--from", dest="start_date", type=parse_survey_date, metavar="DD/MM/YYYY",
+                        help="First survey date to include in a batch run or rollup.")
+    parser.add_argument("--to", dest="end_date", type=parse_survey_date, metavar="DD/MM/YYYY",
+                        help="Last survey date to include in a batch run or rollup.")
+    parser.add_argument("--workers", type=int, help="Worker processes for --batch or --render (default: all CPUs).")
+    parser.add_argument("--shard-mb", type=int, default=BATCH_SHARD_SIZE >> 20,
+                        help="Split files into shards of about this many MiB.")
+    parser.add_argument("--report", default="batch_report.csv", help="Batch report file to write.")
+    parser.add_argument("--results", metavar="FILE",
+                        help="Also append each day's results to FILE (.jsonl, .csv, .db or text).")
+    parser.add_argument("--rotate-mb", type=int,
+                        help="Rotate the --results file once it reaches this many MiB.")
+    parser.add_argument("--sketch-dir", metavar="DIR",
+                        help=f"Also save each surveyed day's mergeable tallies to DIR as <date>{SKETCH_SUFFIX}.")
+    parser.add_argument("--rollup", metavar="DIR",
+                        help="Merge the sketches saved in DIR (optionally --from/--to) into one report.")
+    parser.add_argument("--render", metavar="DIR",
+                        help="Save a histogram image of every survey in DIR (optionally --from/--to), "
+                             "without opening a window.")
+    parser.add_argument("--chart-dir", default="charts", help="Folder for the --render images (default: charts).")
+    parser.add_argument("--chart-format", choices=CHART_FORMATS, default="png",
+                        help="Image format for --render (default: png, which needs Pillow).")
+    parser.add_argument("--chart-size", type=parse_chart_size, default=CHART_SIZE, metavar="WxH",
+                        help=f"Size of the --render images in pixels (default: {CHART_SIZE[0]}x{CHART_SIZE[1]}).")
+    parser.add_argument("--update", metavar="CSV",
+                        help="Analyse only the rows appended to CSV since the last --update run.")
+    parser.add_argument("--state", help="State file for --update (default: CSV name + '.state.json').")
+    parser.add_argument("--final", action="store_true",
+                        help="With --update, treat the CSV as complete and count a last line that has no newline.")
+    parser.add_argument("--histogram", metavar="FILE",
+                        help="Open a live histogram of FILE, drawn while the file is read.")
+    parser.add_argument("--follow", action="store_true",
+                        help="Keep adding rows appended to the --histogram file.")
+    parser.add_argument("--junctions", nargs="+", default=HISTOGRAM_JUNCTIONS, metavar="NAME",
+                        help="Junctions to chart with --histogram or --render, or 'all' "
+                             "(default: the two survey junctions).")
+    parser.add_argument("--bucket-minutes", type=int, default=60,
+                        help="Width of a --histogram or --render time bucket in minutes (default: 60).")
+    parser.add_argument("--convert", metavar="CSV", nargs="+",
+                        help=f"Convert traffic data CSVs to the binary {COLUMNAR_SUFFIX} format and exit.")
+    parser.add_argument("--engine", choices=ENGINES, default="python",
+                        help="Statistics engine for the interactive analysis (default: python). Results are "
+                             "cached per engine.")
+    parser.add_argument("--quarantine", metavar="CSV",
+                        help="Save the rows skipped by each interactive analysis to CSV, with the reason for each.")
+    parser.add_argument("--instrument", metavar="LOG",
+                        help="Time each pipeline stage and save the records to LOG as JSON lines.")
+    parser.add_argument("--profile", choices=["cprofile", "sample"],
+                        help="Profile the run with cProfile or the low-overhead sampling profiler.")
+    parser.add_argument("--profile-out", metavar="FILE", help="Also save the raw --profile results to FILE.")
+    args = parser.parse_args()
+    if args.quarantine and (args.histogram or args.update or args.convert or args.batch or args.rollup or args.render):
+        parser.error("--quarantine only applies to the interactive analysis, not to --batch, --update, "
+                     "--histogram, --convert, --rollup or --render.")
+    if args.quarantine and args.engine not in ("python", "stream"):
+        parser.error("--quarantine needs the python or stream engine.")
+
+    instrumentation = enable_instrumentation() if args.instrument else None
+    try:
+        if args.profile:
+            run_profiled(args.profile, lambda: run_command(args), args.profile_out)
+        else:
+            run_command(args)
+    finally:
+        if instrumentation:
+            instrumentation.report()
+            instrumentation.export(args.instrument)
@@ -0,0 +1,561 @@
+import argparse
+import contextlib
+import csv
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource  # Optional: peak RSS is not reported without it (Windows)
+except ImportError:
+    resource = None
+
+import Python_File as traffic
+
+SAMPLE_DIR = os.path.dirname(os.path.abspath(__file__))  # The sample traffic_data files sit next to this script
+# Values seen in the sample traffic_data files, used to build synthetic surveys
+JUNCTIONS = {"Elm Avenue/Rabbit Road": 30, "Hanley Highway/Westway": 20}
+VEHICLE_TYPES = ["Car", "Truck", "Buss", "Van", "Bicycle", "Motorcycle", "Scooter"]
+WEATHER = ["Overcast", "Rain", "Light Rain", "Heavy Rain", "Fog", "Clear"]
+DIRECTIONS = ["N", "E", "S", "W", "NE", "NW", "SE", "SW"]
+FIELDNAMES = ["JunctionName", "Date", "timeOfDay", "travel_Direction_in", "travel_Direction_out",
+              "Weather_Conditions", "JunctionSpeedLimit", "VehicleSpeed", "VehicleType", "elctricHybrid"]
+
+
+SPEED_LIMITS = [20, 30, 40, 50]  # Limits given to the extra synthetic junctions
+DIRTY_KINDS = ["blank value", "bad speed", "bad time", "short row"]
+
+
+# Function to name and give a speed limit to each of the synthetic junctions
+def synthetic_junctions(count):
+    junctions = dict(list(JUNCTIONS.items())[:count])
+    for number in range(len(junctions) + 1, count + 1):
+        junctions[f"Junction {number}"] = SPEED_LIMITS[number % len(SPEED_LIMITS)]
+    return junctions
+
+
+# Function to write a synthetic traffic data CSV with the given number of rows
+def write_synthetic_csv(file_path, rows, seed=0, junctions=2, dirty_rate=0.0, date="15/06/2024"):
+    """
+    Writes a survey file in the traffic_data schema; the same arguments give the same file.
+
+    Args:
+        rows (int): Data rows to write.
+        seed (int): Seed for the random values.
+        junctions (int): How many junctions to spread the traffic over. The first two are the
+            real survey junctions.
+        dirty_rate (float): Fraction of rows damaged in one of the ways in DIRTY_KINDS.
+        date (str): The survey date written in every row.
+    """
+    rng = random.Random(seed)
+    limits = synthetic_junctions(junctions)
+    names = list(limits)
+    with open(file_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(FIELDNAMES)
+        for _ in range(rows):
+            junction = rng.choice(names)
+            limit = limits[junction]
+            row = [
+                junction, date,
+                f"{rng.randrange(24):02}:{rng.randrange(60):02}:{rng.randrange(60):02}",
+                rng.choice(DIRECTIONS), rng.choice(DIRECTIONS), rng.choice(WEATHER),
+                limit, rng.randint(2, limit + 15), rng.choice(VEHICLE_TYPES),
+                rng.choice(["True", "False"]),
+            ]
+            if dirty_rate and rng.random() < dirty_rate:
+                kind = rng.choice(DIRTY_KINDS)
+                if kind == "blank value":
+                    row[rng.choice([0, 2, 3, 4, 5, 6, 7, 8, 9])] = ""
+                elif kind == "bad speed":
+                    row[7] = "n/a"
+                elif kind == "bad time":
+                    row[2] = rng.choice(["", "25:00:00", "12-30-00"])
+                else:
+                    row = row[:rng.randrange(1, len(row))]
+            writer.writerow(row)
+
+
+# Function to write several days of synthetic surveys into a folder
+def generate_surveys(directory, rows, days=1, junctions=2, dirty_rate=0.0, seed=0):
+    os.makedirs(directory, exist_ok=True)
+    file_paths = []
+    for day in range(days):
+        survey_date = datetime.date(2024, 1, 1) + datetime.timedelta(days=day)
+        file_path = os.path.join(directory, f"traffic_data{survey_date:%d%m%Y}.csv")
+        write_synthetic_csv(file_path, rows, seed + day, junctions, dirty_rate, f"{survey_date:%d/%m/%Y}")
+        file_paths.append(file_path)
+    return file_paths
+
+
+# Function to time one call, returning (seconds, result)
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+# Benchmark: row-by-row engine against the NumPy columnar engine
+def benchmark_engines(rows):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "traffic_data01012024.csv")
+        write_synthetic_csv(file_path, rows)
+
+        load_time, table = timed(traffic.load_traffic_table, file_path)
+        python_time, python_outcomes = timed(traffic.process_csv_data, file_path, table)
+        print(f"{rows:>10} rows | parse {load_time:.3f}s | python engine {python_time:.3f}s", end="")
+
+        if traffic.np is None:
+            print(" | numpy engine skipped (NumPy not installed)")
+            return
+        numpy_time, numpy_outcomes = timed(traffic.process_csv_data, file_path, table, engine="numpy")
+        same = "identical" if numpy_outcomes == python_outcomes else "DIFFERENT"
+        print(f" | numpy engine {numpy_time:.3f}s | speedup {python_time / numpy_time:.1f}x | outcomes {same}")
+
+
+# Benchmark: parse-then-process against the constant-memory streaming engine
+def benchmark_streaming(rows):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "traffic_data01012024.csv")
+        write_synthetic_csv(file_path, rows)
+
+        for label, engine in (("table", "python"), ("stream", "stream")):
+            seconds, _ = timed(traffic.process_csv_data, file_path, engine=engine)
+            # Memory is traced in a second run, as tracing slows the code down
+            tracemalloc.start()
+            traffic.process_csv_data(file_path, engine=engine)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{rows:>10} rows | {label:6} {seconds:.3f}s | peak memory {peak / 2**20:.1f} MiB")
+
+
+# Benchmark: per-row validation and type coercion, dict rows against the compiled row decoder
+def benchmark_decoder(rows):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "traffic_data01012024.csv")
+        write_synthetic_csv(file_path, rows, dirty_rate=0.01)
+        table = traffic.load_traffic_table(file_path)
+        required_columns = traffic.REQUIRED_COLUMNS
+
+        # The checks and conversions the row loop made on each dict row before the decoder
+        def check_dict_rows():
+            for row in table.dict_rows():
+                if not all(row[col].strip() for col in required_columns):
+                    continue
+                row["VehicleType"].strip().lower()
+                row["elctricHybrid"].strip().lower()
+                row["Weather_Conditions"].strip().lower()
+                try:
+                    int(row["VehicleSpeed"]) > int(row["JunctionSpeedLimit"])
+                except ValueError:
+                    continue
+                row["timeOfDay"].split(":")[0]
+
+        def decode_rows():
+            decode = traffic.RowDecoder(table.fieldnames).decode
+            for row in table.rows:
+                decode(row)
+
+        dict_time, _ = timed(check_dict_rows)
+        decode_time, _ = timed(decode_rows)
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine_time, _ = timed(traffic.process_csv_data, file_path, table)
+        print(f"{rows:>10} rows | dict rows {dict_time / rows * 1e6:.2f}us/row"
+              f" | compiled decoder {decode_time / rows * 1e6:.2f}us/row ({dict_time / decode_time:.1f}x)"
+              f" | python engine {engine_time / rows * 1e6:.2f}us/row")
+
+
+# Benchmark: parsing the CSV against mapping the binary columnar file
+def benchmark_columnar(rows):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "traffic_data01012024.csv")
+        write_synthetic_csv(file_path, rows)
+        convert_time, binary_path = timed(traffic.convert_to_columnar, file_path)
+        print(f"{rows:>10} rows | convert {convert_time:.3f}s | "
+              f"{os.path.getsize(file_path) / 2**20:.1f} MiB csv -> {os.path.getsize(binary_path) / 2**20:.1f} MiB tvc")
+
+        engine = "numpy" if traffic.np is not None else "python"
+        for label, path in (("csv", file_path), ("tvc", binary_path)):
+            load_time, table = timed(traffic.load_traffic_table, path)
+            process_time, _ = timed(traffic.process_csv_data, path, table, engine)
+            tracemalloc.start()
+            traffic.process_csv_data(path, traffic.load_traffic_table(path), engine)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{rows:>10} rows | {label} load {load_time:.3f}s | {engine} engine {process_time:.3f}s"
+                  f" | peak memory {peak / 2**20:.1f} MiB")
+
+
+# Benchmark: ad-hoc queries on a TrafficIndex against a full scan of the rows
+def benchmark_index(rows, repeats=100):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "traffic_data01012024.csv")
+        write_synthetic_csv(file_path, rows)
+        table = traffic.load_traffic_table(file_path)
+        build_time, index = timed(traffic.TrafficIndex, table)
+
+        positions = table.positions
+        junction_at, time_at = positions["JunctionName"], positions["timeOfDay"]
+        vehicle_at, weather_at = positions["VehicleType"], positions["Weather_Conditions"]
+        scan_time, _ = timed(sum, (1 for row in table.rows
+                                   if row[junction_at] == traffic.ELM_AVENUE and "07:00:00" <= row[time_at] < "09:30:00"
+                                   and row[vehicle_at].lower() == "truck" and row[weather_at].lower() == "rain"))
+        query = {"junction": traffic.ELM_AVENUE, "start": "07:00", "end": "09:30",
+                 "vehicle_type": "truck", "weather": "rain"}
+        query_time, _ = timed(lambda: [index.count(**query) for _ in range(repeats)])
+        outcomes_time, _ = timed(index.outcomes, file_path)
+        print(f"{rows:>10} rows | build index {build_time:.3f}s | full scan {scan_time * 1000:.2f}ms"
+              f" | query {query_time / repeats * 1000:.3f}ms | all outcomes {outcomes_time * 1000:.2f}ms")
+
+
+# Benchmark: writing many reports through the buffered results writer, in each format
+def benchmark_results(reports=20_000):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "traffic_data01012024.csv")
+        write_synthetic_csv(file_path, 1000)
+        outcomes = traffic.process_csv_data(file_path)
+        for suffix in (".jsonl", ".csv", ".db", ".txt"):
+            results_path = os.path.join(directory, "results" + suffix)
+            with traffic.ResultsWriter(results_path) as writer:
+                seconds, _ = timed(lambda: [writer.write(outcomes) for _ in range(reports)] and writer.flush())
+            print(f"{reports:>10} reports | {suffix[1:]:5} {seconds:.3f}s | {reports / seconds * 60:,.0f} reports/min"
+                  f" | {os.path.getsize(results_path) / 2**20:.1f} MiB")
+
+
+# Benchmark: one worker against a process pool on several days of surveys
+def benchmark_batch(rows, days=4, workers=None):
+    workers = workers or os.cpu_count()
+    with tempfile.TemporaryDirectory() as directory:
+        for day in range(1, days + 1):
+            write_synthetic_csv(os.path.join(directory, f"traffic_data{day:02}012024.csv"), rows, seed=day)
+        file_paths = traffic.find_traffic_files(directory)
+        shard_size = max(os.path.getsize(file_paths[0]) // workers, 1 << 16)
+
+        serial_time, _ = timed(traffic.analyse_batch, file_paths, 1, shard_size)
+        pool_time, _ = timed(traffic.analyse_batch, file_paths, workers, shard_size)
+        print(f"{rows:>10} rows x {days} days | 1 worker {serial_time:.3f}s | "
+              f"{workers} workers {pool_time:.3f}s | speedup {serial_time / pool_time:.1f}x")
+
+
+# Benchmark: headless chart images, one at a time and a folder of days over a process pool
+def benchmark_render(rows=10_000, days=16, workers=None):
+    workers = workers or os.cpu_count()
+    with tempfile.TemporaryDirectory() as directory:
+        for day in range(1, days + 1):
+            write_synthetic_csv(os.path.join(directory, f"traffic_data{day:02}012024.csv"), rows, seed=day)
+        file_paths = traffic.find_traffic_files(directory)
+        traffic_data = traffic.count_traffic(traffic.load_traffic_table(file_paths[0]))
+        formats = ["svg"] + (["png"] if traffic.Image is not None else [])
+        for image_format in formats:
+            chart_file = os.path.join(directory, "chart." + image_format)
+            seconds, _ = timed(lambda: [traffic.save_chart(traffic_data, "01/01/2024", chart_file)
+                                        for _ in range(20)])
+            print(f"{'1 chart':>10} | {image_format} {seconds / 20 * 1000:.1f} ms per chart"
+                  f" | {os.path.getsize(chart_file) / 1024:.0f} KiB")
+
+        chart_dir = os.path.join(directory, "charts")
+        with contextlib.redirect_stdout(io.StringIO()):
+            serial_time, _ = timed(traffic.render_charts, file_paths, chart_dir, formats[-1], 1)
+            pool_time, _ = timed(traffic.render_charts, file_paths, chart_dir, formats[-1], workers)
+        print(f"{rows:>10} rows x {days} days | {formats[-1]} 1 worker {serial_time:.3f}s | "
+              f"{workers} workers {pool_time:.3f}s | speedup {serial_time / pool_time:.1f}x")
+
+
+# Benchmark: redrawing the histogram after many small count changes
+def benchmark_redraw(updates=1000):
+    if traffic.tk is None:
+        print("histogram redraw skipped (Tkinter not installed)")
+        return
+    try:
+        root = traffic.tk.Tk()
+    except traffic.tk.TclError:
+        print("histogram redraw skipped (no display)")
+        return
+    root.geometry("1200x700")
+    file_path = os.path.join(SAMPLE_DIR, "traffic_data21062024.csv")
+    traffic_data = traffic.count_traffic(traffic.load_traffic_table(file_path))
+    app = traffic.HistogramApp(root, file_path, "21/06/2024", traffic_data=traffic_data)
+    rng = random.Random(0)
+
+    def run(full):
+        start = time.perf_counter()
+        for _ in range(updates):
+            rng.choice(traffic_data.counts)[rng.randrange(traffic_data.bucket_count)] += 1
+            if full:
+                app.drawn_layout = None  # Move every item, as a resize would
+            app.draw_histogram()
+            root.update_idletasks()
+        return time.perf_counter() - start
+
+    diff_time = run(full=False)
+    full_time = run(full=True)
+    root.destroy()
+    print(f"{updates:>10} redraws | changed bars only {diff_time * 1000 / updates:.3f} ms each | "
+          f"every bar {full_time * 1000 / updates:.3f} ms each")
+
+
+# Benchmark suite: per-stage timings of one run of the whole pipeline, in a fresh process
+STAGES = ["parse", "process", "histogram counts", "save results", "draw"]
+
+
+# Function to read this process's peak resident set size in MiB, or None
+def peak_rss_mib():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # Bytes on macOS, KiB elsewhere
+
+
+# Function to time a histogram draw, or None when there is no display or no Tkinter
+def time_draw(traffic_data):
+    if traffic.tk is None:
+        return None
+    try:
+        root = traffic.tk.Tk()
+    except traffic.tk.TclError:
+        return None
+    root.geometry("1200x700")
+    app = traffic.HistogramApp(root, "", "benchmark", traffic_data=traffic_data)
+    app.drawn_chart = None  # Time a first draw: every canvas item is created
+    seconds, _ = timed(app.draw_histogram)
+    root.destroy()
+    return seconds
+
+
+# Function to run every stage of the pipeline on one file and report the timings
+def measure_pipeline(file_path, engine="python"):
+    """
+    Runs parse, process_csv_data, the histogram counts of HistogramApp.load_traffic_data,
+    save_results_to_file and draw_histogram on file_path.
+
+    The stream engine has no parse stage and counts the histogram with the ingestion
+    thread's row loop, so its memory stays constant. Output printed by the stages is
+    discarded so that it is not timed as terminal I/O.
+    """
+    rows = -1
+    with open(file_path, "rb") as file:
+        for _ in file:
+            rows += 1
+    stages = {}
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as quiet, \
+            contextlib.redirect_stdout(quiet):
+        table = None
+        if engine != "stream":
+            stages["parse"], table = timed(traffic.load_traffic_table, file_path)
+        stages["process"], outcomes = timed(traffic.process_csv_data, file_path, table, engine)
+        if table is not None:
+            stages["histogram counts"], traffic_data = timed(traffic.count_traffic, table)
+        else:
+            updates = traffic.queue.Queue()
+            stages["histogram counts"], _ = timed(traffic.TrafficIngestor(file_path, updates).run)
+            traffic_data = traffic.TrafficHistogram()
+            while not updates.empty():
+                traffic_data.add_counts(updates.get())
+        stages["save results"], _ = timed(traffic.save_results_to_file, outcomes,
+                                          os.path.join(directory, "results.txt"))
+        draw_time = time_draw(traffic_data)
+        if draw_time is not None:
+            stages["draw"] = draw_time
+    total = sum(stages.values())
+    return {
+        "rows": rows,
+        "engine": engine,
+        "stages": stages,
+        "total_seconds": total,
+        "rows_per_second": rows / total if total else None,
+        "peak_rss_mib": peak_rss_mib(),
+    }
+
+
+# Function to generate (or reuse) a synthetic file and measure it in a child process
+def measure_size(rows, engine, junctions=2, dirty_rate=0.0, data_dir=None):
+    with tempfile.TemporaryDirectory() as directory:
+        directory = data_dir or directory
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, f"traffic_data_{rows}_{junctions}_{dirty_rate}.csv")
+        if not os.path.exists(file_path):
+            write_synthetic_csv(file_path, rows, junctions=junctions, dirty_rate=dirty_rate)
+        # A new process per size, so that the peak RSS belongs to this size alone
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            return executor.submit(measure_pipeline, file_path, engine).result()
+
+
+# Function to print one suite result as a table row
+def print_result(result):
+    stages = " | ".join(f"{stage} {result['stages'][stage]:.3f}s"
+                        for stage in STAGES if stage in result["stages"])
+    rss = f"{result['peak_rss_mib']:.0f} MiB" if result["peak_rss_mib"] is not None else "n/a"
+    print(f"{result['rows']:>11} rows | {result['engine']:6} | {stages} | "
+          f"{result['rows_per_second']:,.0f} rows/s | peak RSS {rss}")
+
+
+# Function to compare suite results with a saved baseline
+def compare_results(results, baseline, tolerance=0.2):
+    """
+    Prints every stage that is more than tolerance slower than in the baseline.
+
+    Returns the number of regressions found; only runs with the same row count and engine
+    are compared.
+    """
+    previous = {(result["rows"], result["engine"]): result for result in baseline["results"]}
+    regressions = 0
+    for result in results:
+        old = previous.get((result["rows"], result["engine"]))
+        if old is None:
+            continue
+        for stage, seconds in result["stages"].items():
+            old_seconds = old["stages"].get(stage)
+            if old_seconds and seconds > old_seconds * (1 + tolerance):
+                regressions += 1
+                print(f"REGRESSION {result['rows']} rows {result['engine']} {stage}: "
+                      f"{old_seconds:.3f}s -> {seconds:.3f}s ({seconds / old_seconds:.2f}x)")
+    print(f"{regressions} regressions against the baseline (tolerance {tolerance:.0%}).")
+    return regressions
+
+
+# Function to run the suite over several sizes, optionally saving or comparing a baseline
+def run_suite(sizes, engine="python", junctions=2, dirty_rate=0.0, data_dir=None,
+              save=None, compare=None, tolerance=0.2):
+    results = []
+    for rows in sizes:
+        result = measure_size(rows, engine, junctions, dirty_rate, data_dir)
+        print_result(result)
+        results.append(result)
+    if save:
+        with open(save, "w") as file:
+            json.dump({
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "junctions": junctions,
+                "dirty_rate": dirty_rate,
+                "results": results,
+            }, file, indent=2)
+        print(f"Baseline saved to {save}")
+    if compare:
+        with open(compare) as file:
+            return compare_results(results, json.load(file), tolerance)
+    return 0
+
+
+# Verification: every engine, from the CSV and from its .tvc file, gives the python engine's outcomes
+def verify_file(file_path):
+    """Asserts that every engine and the .tvc path reproduce the outcomes and histogram counts of file_path."""
+    with tempfile.TemporaryDirectory() as directory:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        binary_path = traffic.convert_to_columnar(file_path, os.path.join(directory, name + traffic.COLUMNAR_SUFFIX))
+        with contextlib.redirect_stdout(io.StringIO()):  # Skipped-row reports
+            expected = traffic.process_csv_data(file_path)
+            expected_counts = traffic.count_traffic(traffic.load_traffic_table(file_path), None).to_dict()
+            assert expected, f"python engine gave no outcomes for {file_path}"
+            for path in (file_path, binary_path):
+                table_counts = traffic.count_traffic(traffic.load_traffic_table(path), None).to_dict()
+                assert table_counts == expected_counts, f"histogram counts differ for {path}"
+                for engine in traffic.ENGINES:
+                    if engine == "numpy" and traffic.np is None:
+                        continue  # Would fall back to the python engine
+                    histogram = traffic.TrafficHistogram(None)
+                    outcomes = traffic.process_csv_data(path, engine=engine, histogram=histogram)
+                    assert outcomes == dict(expected, **{"File Name": path}), f"{engine} engine differs on {path}"
+                    if engine == "stream":
+                        assert histogram.to_dict() == expected_counts, f"stream histogram counts differ for {path}"
+
+
+# Verification: --update totals match a full analysis, including a last line with no newline
+def verify_incremental(file_path):
+    with open(file_path, "rb") as file:
+        data = file.read().rstrip(b"\n")
+    with tempfile.TemporaryDirectory() as directory:
+        copy_path = os.path.join(directory, os.path.basename(file_path))
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Appended in two parts, the first ending mid-line
+            with open(copy_path, "wb") as file:
+                file.write(data[:len(data) // 2])
+            analysis = traffic.IncrementalAnalysis(copy_path)
+            analysis.refresh()
+            with open(copy_path, "ab") as file:
+                file.write(data[len(data) // 2:])
+            analysis.refresh()
+            outcomes = analysis.refresh()  # Unchanged since the last refresh: the last line counts
+            expected = traffic.process_csv_data(copy_path)
+            assert outcomes == expected, f"--update differs from a full analysis of {file_path}"
+            assert traffic.IncrementalAnalysis(copy_path).refresh(final=True) == expected, \
+                f"--update --final differs from a full analysis of {file_path}"
+
+
+# Function to check every engine on the sample files and on clean and dirty synthetic surveys
+def run_verify(rows=20_000):
+    file_paths = sorted(glob.glob(os.path.join(SAMPLE_DIR, "traffic_data*.csv")))
+    with tempfile.TemporaryDirectory() as directory:
+        for day, junctions, dirty_rate in ((1, 2, 0.0), (2, 6, 0.05)):  # One clean and one dirty survey
+            file_path = os.path.join(directory, f"traffic_data{day:02}012024.csv")
+            write_synthetic_csv(file_path, rows, junctions=junctions, dirty_rate=dirty_rate)
+            file_paths.append(file_path)
+        for file_path in file_paths:
+            verify_file(file_path)
+            verify_incremental(file_path)
+            print(f"verified {os.path.basename(file_path)}: {', '.join(traffic.ENGINES)}, .tvc and --update match")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the TrafficViz statistics engines.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Synthetic file sizes to benchmark.")
+    parser.add_argument("--suite", action="store_true",
+                        help="Time every pipeline stage at each size instead of comparing engines.")
+    parser.add_argument("--engine", default="python", choices=traffic.ENGINES,
+                        help="Engine used by --suite; use stream for the largest sizes.")
+    parser.add_argument("--junctions", type=int, default=2, help="Junctions in the synthetic data.")
+    parser.add_argument("--dirty-rate", type=float, default=0.0,
+                        help="Fraction of synthetic rows with missing or invalid values.")
+    parser.add_argument("--data-dir", help="Keep generated files here and reuse them between runs.")
+    parser.add_argument("--save", metavar="JSON", help="Save the --suite results as a baseline.")
+    parser.add_argument("--compare", metavar="JSON", help="Report --suite stages slower than a saved baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Slowdown allowed before a stage counts as a regression (default: 0.2).")
+    parser.add_argument("--generate", metavar="DIR",
+                        help="Only write synthetic traffic_data*.csv files to DIR "
+                             "(to DIR/<rows>_rows for each size when several --rows are given).")
+    parser.add_argument("--days", type=int, default=1, help="Days of surveys written by --generate.")
+    parser.add_argument("--verify", action="store_true",
+                        help="Check that every engine gives identical outcomes, on the sample files and on "
+                             "clean and dirty synthetic data; exits with an error on any difference.")
+    args = parser.parse_args()
+
+    if args.verify:
+        run_verify()
+    elif args.generate:
+        for rows in args.rows:
+            # Every size writes the same file names, so several sizes each get their own folder
+            directory = os.path.join(args.generate, f"{rows}_rows") if len(args.rows) > 1 else args.generate
+            for file_path in generate_surveys(directory, rows, args.days, args.junctions, args.dirty_rate):
+                print(f"Wrote {rows} rows to {file_path}")
+    elif args.suite:
+        regressions = run_suite(args.rows, args.engine, args.junctions, args.dirty_rate, args.data_dir,
+                                args.save, args.compare, args.tolerance)
+        sys.exit(1 if regressions else 0)
+    else:
+        for rows in args.rows:
+            benchmark_engines(rows)
+        for rows in args.rows:
+            benchmark_streaming(rows)
+        for rows in args.rows:
+            benchmark_decoder(rows)
+        for rows in args.rows:
+            benchmark_columnar(rows)
+        for rows in args.rows:
+            benchmark_index(rows)
+        benchmark_results()
+        for rows in args.rows:
+            benchmark_batch(rows)
+        benchmark_render()
+        benchmark_redraw()